@@ -0,0 +1,83 @@
+import os
+import re
+import time
+import threading
+import numpy as np
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+
+STREAM_PIECE_RE = re.compile(r"\S+\s*|\s+")
+
+
+class SemanticAnswerCache:
+    """Answers to first-turn questions, looked up by cosine similarity of the question embedding.
+
+    Entries live in a fixed (size x dim) matrix, so a lookup is one matrix-vector product.
+    Each row is tagged with the index version it was answered from and only matches lookups
+    against that version; rows of retired versions are never hit and so age out as least
+    recently used. When full, the least recently used row is overwritten.
+    """
+
+    def __init__(self, maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.clear()
+
+    def clear(self):
+        self.vectors = None
+        self.answers = [None] * self.maxsize
+        self.versions = [None] * self.maxsize
+        self.stored_at = np.full(self.maxsize, -np.inf)
+        self.used_at = np.full(self.maxsize, -np.inf)
+
+    def unit_vector(self, retriever, question):
+        vector = retriever.embed_query(question)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get(self, retriever, question):
+        vector = self.unit_vector(retriever, question)
+        version = retriever.version()
+        with self.lock:
+            if self.vectors is not None:
+                now = time.monotonic()
+                similarity = self.vectors @ vector
+                similarity[now - self.stored_at > self.ttl] = -np.inf
+                similarity[[v != version for v in self.versions]] = -np.inf
+                row = int(np.argmax(similarity))
+                if similarity[row] >= self.threshold:
+                    self.used_at[row] = now
+                    self.hits += 1
+                    return self.answers[row]
+            self.misses += 1
+            return None
+
+    def put(self, retriever, question, answer):
+        vector = self.unit_vector(retriever, question)
+        version = retriever.version()
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.maxsize, len(vector)), dtype=np.float32)
+            now = time.monotonic()
+            row = int(np.argmin(np.where(now - self.stored_at > self.ttl, -np.inf, self.used_at)))
+            self.vectors[row] = vector
+            self.answers[row] = answer
+            self.versions[row] = version
+            self.stored_at[row] = self.used_at[row] = now
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        live = int(np.sum(time.monotonic() - self.stored_at <= self.ttl))
+        return {"size": live, "hits": self.hits,
+                "misses": self.misses, "hit_rate": round(self.hits / lookups, 3) if lookups else None}
+
+def stream_pieces(answer):
+    """Split a cached answer into word-sized pieces so it can be streamed like a live completion."""
+    return STREAM_PIECE_RE.findall(answer)
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,447 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crawl import run_crawler
+
+
+class FakeSiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fanout = 8
+    pages = 200
+    latency = 0.05
+
+    def send_text(self, body, content_type):
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        host = self.headers.get("Host")
+        if self.path == "/robots.txt":
+            return self.send_text(f"User-agent: *\nDisallow: /private/\nSitemap: http://{host}/sitemap.xml\n",
+                                  "text/plain")
+        if self.path == "/sitemap.xml":
+            urls = "".join(f"<url><loc>http://{host}/page/{p}</loc><priority>0.9</priority></url>"
+                           for p in range(self.pages - 10, self.pages))
+            return self.send_text('<?xml version="1.0" encoding="UTF-8"?>'
+                                  f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>',
+                                  "application/xml")
+        try:
+            page = int(self.path.strip("/").split("/")[-1] or 0)
+        except ValueError:
+            page = 0
+        etag = f'"page-{page}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        children = range(page * self.fanout + 1, min(page * self.fanout + self.fanout + 1, self.pages))
+        links = "".join(f'<a href="/page/{c}">Page {c}</a>' for c in children)
+        body = f"<html><body><h1>Page {page}</h1><p>Admissions text {page}</p>{links}</body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_site(handler=FakeSiteHandler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Streams a fixed completion as server-sent events, one token every `token_delay` seconds."""
+    protocol_version = "HTTP/1.0"
+    tokens = 20
+    token_delay = 0.025
+    requests = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        FakeOpenAIHandler.requests += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i in range(self.tokens):
+            time.sleep(self.token_delay)
+            chunk = {"id": "bench", "object": "chat.completion.chunk", "created": 0, "model": "bench",
+                     "choices": [{"index": 0, "delta": {"content": f"token{i} "}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+class FakeWebSocket:
+    def __init__(self, question):
+        self.questions = [question]
+        self.received = []
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        from fastapi import WebSocketDisconnect
+        if not self.questions:
+            raise WebSocketDisconnect()
+        return self.questions.pop()
+
+    async def send_text(self, text):
+        self.received.append(text)
+
+
+def bench_chat(parallel=(1, 8, 32)):
+    import asyncio
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_SECRET_KEY", "bench")
+    import main
+    main.openai.base_url = os.environ["OPENAI_BASE_URL"]  # the client may predate this fake server
+    main.warm_up()
+
+    async def chats(n):
+        # Distinct questions so neither the query cache nor the answer cache short-circuits a chat.
+        sockets = [FakeWebSocket(f"question {random.random()} about tuition fees") for _ in range(n)]
+        started = time.perf_counter()
+        await asyncio.gather(*(main.chat_socket(ws) for ws in sockets))
+        assert all(len(ws.received) == FakeOpenAIHandler.tokens for ws in sockets)
+        return time.perf_counter() - started
+
+    try:
+        asyncio.run(chats(1))  # warm up the embedding model
+        single = None
+        for n in parallel:
+            seconds = asyncio.run(chats(n))
+            single = single or seconds
+            print(f"{n:>3} parallel chats: {seconds:.2f}s ({seconds / single:.1f}x one chat)")
+    finally:
+        server.shutdown()
+
+
+def bench_coalescing(parallel=32):
+    import asyncio
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_SECRET_KEY", "bench")
+    import main
+    main.openai.base_url = os.environ["OPENAI_BASE_URL"]  # the client may predate this fake server
+    main.warm_up()
+
+    async def chats():
+        # The same new question in different spellings, asked before the first answer is cached.
+        question = f"What are the tuition fees for {random.random()}?"
+        sockets = [FakeWebSocket(question.upper() if i % 2 else question) for i in range(parallel)]
+        FakeOpenAIHandler.requests = 0
+        started = time.perf_counter()
+        await asyncio.gather(*(main.chat_socket(ws) for ws in sockets))
+        assert all(ws.received == sockets[0].received for ws in sockets)
+        return time.perf_counter() - started
+
+    try:
+        seconds = asyncio.run(chats())
+    finally:
+        server.shutdown()
+    print(f"{parallel} identical questions: {seconds:.2f}s, {FakeOpenAIHandler.requests} completion request(s), "
+          f"stats: {main.in_flight.stats()}")
+
+
+def bench_crawl():
+    server = start_fake_site()
+    start_url = f"http://127.0.0.1:{server.server_address[1]}/page/0"
+    results = {}
+    try:
+        for concurrency in (1, 16):
+            output_dir = tempfile.mkdtemp(prefix="bench_crawl_")
+            try:
+                stats = run_crawler(start_url, depth=3, output_dir=output_dir,
+                                    concurrency=concurrency, host_rate=0)
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+            results[concurrency] = stats
+    finally:
+        server.shutdown()
+    for concurrency, stats in results.items():
+        print(f"concurrency={concurrency:<3} pages={stats['pages']:<4} "
+              f"{stats['seconds']:.2f}s {stats['pages_per_second']:.1f} pages/s")
+    print(f"speedup: {results[16]['pages_per_second'] / results[1]['pages_per_second']:.1f}x")
+
+
+def bench_recrawl():
+    server = start_fake_site()
+    start_url = f"http://127.0.0.1:{server.server_address[1]}/page/0"
+    output_dir = tempfile.mkdtemp(prefix="bench_recrawl_")
+    try:
+        full = run_crawler(start_url, depth=3, output_dir=output_dir, host_rate=0)
+        again = run_crawler(start_url, depth=3, output_dir=output_dir, host_rate=0)
+    finally:
+        server.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+    print(f"full crawl: {full['seconds']:.2f}s, recrawl: {again['seconds']:.2f}s, "
+          f"unchanged pages skipped: {len(again['changes']['unchanged'])}")
+
+
+def legacy_pdf_pages(pdf_path):
+    # The sequential, list-based loader that load_pdfs() replaced, kept for comparison.
+    import fitz
+    doc = fitz.open(pdf_path)
+    texts = []
+    for page in doc:
+        text_text = page.get_text("text").strip()
+        block_text = "\n".join(
+            block[4].strip()
+            for block in sorted(page.get_text("blocks"), key=lambda b: (b[1], b[0]))
+            if block[4].strip()
+        )
+        combined = text_text
+        if block_text and block_text not in text_text:
+            combined += "\n" + block_text
+        paragraphs = []
+        for para in combined.split("\n\n"):
+            para = para.strip()
+            if para and para not in paragraphs:
+                paragraphs.append(para)
+        texts.append("\n\n".join(paragraphs))
+    doc.close()
+    return texts
+
+
+def make_large_pdf(path, pages=400, paragraphs=60):
+    import fitz
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        for i in range(paragraphs):
+            # Separate text blocks give get_text("blocks") one block per paragraph.
+            page.insert_text((36, 30 + i * 12), f"Section {p}.{i}: tuition, fees and admission rule {i}.",
+                             fontsize=6)
+    doc.save(path)
+    doc.close()
+
+
+def bench_pdf():
+    from data import PDF_WORKERS, load_pdfs
+    workdir = tempfile.mkdtemp(prefix="bench_pdf_")
+    try:
+        pdf_path = f"{workdir}/large.pdf"
+        make_large_pdf(pdf_path)
+        started = time.perf_counter()
+        legacy = legacy_pdf_pages(pdf_path)
+        legacy_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        docs = load_pdfs([pdf_path])
+        parallel_seconds = time.perf_counter() - started
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"legacy loader: {len(legacy)} pages in {legacy_seconds:.2f}s")
+    print(f"load_pdfs:     {len(docs)} pages in {parallel_seconds:.2f}s ({PDF_WORKERS} workers)")
+    print(f"speedup: {legacy_seconds / parallel_seconds:.1f}x")
+
+
+def bench_docstore():
+    import tracemalloc
+    from langchain_community.vectorstores import FAISS
+    from docstore import save_mmap_vectorstore, load_mmap_vectorstore
+    workdir = tempfile.mkdtemp(prefix="bench_docstore_")
+    try:
+        pickled = FAISS.load_local("vectorstore", None, allow_dangerous_deserialization=True)
+        save_mmap_vectorstore(pickled, workdir)
+        del pickled
+        loaders = {
+            "pickle": lambda: FAISS.load_local("vectorstore", None, allow_dangerous_deserialization=True),
+            "mmap": lambda: load_mmap_vectorstore(workdir, None),
+        }
+        for name, load in loaders.items():
+            tracemalloc.start()
+            started = time.perf_counter()
+            store = load()
+            seconds = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            ids = list(store.index_to_docstore_id.values())[:10]
+            started = time.perf_counter()
+            for doc_id in ids:
+                store.docstore.search(doc_id)
+            lookup = (time.perf_counter() - started) / len(ids)
+            print(f"{name:<7} load {seconds * 1000:.1f}ms, peak Python heap {peak / 1e6:.1f} MB, "
+                  f"{lookup * 1e6:.0f}µs per top-k lookup")
+            if hasattr(store.docstore, "close"):
+                store.docstore.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_index(count=20000, dim=384, queries=200, k=10):
+    import faiss
+    import numpy as np
+    from faiss_index import INDEX_TYPES, build_index
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(200, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.3 * rng.normal(size=(count, dim)).astype(np.float32)
+    probes = vectors[rng.integers(0, count, queries)] + 0.1 * rng.normal(size=(queries, dim)).astype(np.float32)
+    exact = None
+    print(f"{count} vectors x {dim} dims, {queries} single-query searches, k={k}")
+    for index_type in INDEX_TYPES:
+        started = time.perf_counter()
+        index = build_index(vectors, index_type)
+        build_seconds = time.perf_counter() - started
+        latencies, results = [], []
+        for probe in probes:
+            started = time.perf_counter()
+            _, ids = index.search(probe[None, :], k)
+            latencies.append(time.perf_counter() - started)
+            results.append(ids[0])
+        if exact is None:
+            exact = results
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(results, exact)])
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        size = len(faiss.serialize_index(index)) / 1e6
+        print(f"{index_type:<8} recall@{k} {recall:.3f}  p50 {p50:.3f}ms  p99 {p99:.3f}ms  "
+              f"size {size:.1f} MB  build {build_seconds:.1f}s")
+
+
+def bench_lexical(queries=500, k=20):
+    from langchain_community.vectorstores import FAISS
+    from lexical import build_lexical_index
+    store = FAISS.load_local("vectorstore", None, allow_dangerous_deserialization=True)
+    started = time.perf_counter()
+    index = build_lexical_index(store)
+    build_seconds = time.perf_counter() - started
+    texts = [store.docstore.search(doc_id).page_content for doc_id in index.ids]
+    rng = random.Random(0)
+    words = [w for text in texts for w in text.split() if len(w) > 3]
+    samples = [" ".join(rng.sample(words, 6)) for _ in range(queries)]
+    timings = []
+    for query in samples:
+        started = time.perf_counter()
+        index.search(query, k)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"BM25 over {len(index.ids)} chunks, {len(index.terms)} terms: built in {build_seconds:.2f}s, "
+          f"{index.doc_ids.nbytes + index.tfs.nbytes} posting bytes")
+    print(f"query p50 {timings[len(timings) // 2] * 1000:.3f}ms, p99 {timings[int(len(timings) * 0.99)] * 1000:.3f}ms")
+
+
+def bench_batch(queries=1000, k=10):
+    import numpy as np
+    from langchain_community.vectorstores import FAISS
+    from retrieval import search_matrix
+    store = FAISS.load_local("vectorstore", None, allow_dangerous_deserialization=True)
+    rng = np.random.default_rng(0)
+    vectors = store.index.reconstruct_n(0, store.index.ntotal)
+    probes = vectors[rng.integers(0, len(vectors), queries)] + 0.05 * rng.normal(size=(queries, vectors.shape[1]))
+    probes = probes.astype(np.float32)
+    started = time.perf_counter()
+    looped = [search_matrix(store, probe[None, :], k)[0] for probe in probes]
+    loop_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    batched = search_matrix(store, probes, k)
+    batch_seconds = time.perf_counter() - started
+    # Equal-distance (duplicate) chunks may swap places between the two BLAS paths.
+    assert all({i for i, _ in a} == {i for i, _ in b} for a, b in zip(looped, batched))
+    print(f"{queries} queries over {store.index.ntotal} chunks: loop {loop_seconds * 1000:.1f}ms, "
+          f"one matrix search {batch_seconds * 1000:.1f}ms ({loop_seconds / batch_seconds:.1f}x)")
+
+
+def wait_for_workers(port, workers, timeout=300):
+    import urllib.request
+    deadline = time.time() + timeout
+    ready = 0
+    while ready < workers * 4:
+        if time.time() > deadline:
+            raise TimeoutError("workers did not become ready")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=5):
+                ready += 1
+        except Exception:
+            ready = 0
+            time.sleep(0.5)
+
+def bench_workers(worker_counts=(1, 4, 8)):
+    import socket
+    import subprocess
+    import urllib.request
+    import psutil
+    from langchain_community.vectorstores import FAISS
+    from docstore import save_mmap_vectorstore
+    workdir = tempfile.mkdtemp(prefix="bench_workers_")
+    save_mmap_vectorstore(FAISS.load_local("vectorstore", None, allow_dangerous_deserialization=True), workdir)
+    modes = {
+        "per-worker load": {"PRELOAD_MODELS": "0", "INDEX_MMAP": "0"},
+        "preload": {"PRELOAD_MODELS": "1", "INDEX_MMAP": "0"},
+        "preload + mmap": {"PRELOAD_MODELS": "1", "INDEX_MMAP": "1"},
+    }
+    print("RSS counts shared pages in every worker; PSS splits them between workers, USS is private memory.")
+    try:
+        for mode, env in modes.items():
+            for workers in worker_counts:
+                with socket.socket() as sock:
+                    sock.bind(("127.0.0.1", 0))
+                    port = sock.getsockname()[1]
+                server = subprocess.Popen(
+                    [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers),
+                     "-b", f"127.0.0.1:{port}", "main:app"],
+                    env={**os.environ, **env, "VECTOR_STORE_PATHS": workdir, "BUILD_REPORT_DIR": workdir + "_reports"},
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                try:
+                    wait_for_workers(port, workers)
+                    body = json.dumps({"queries": ["tuition fees", "library opening hours"], "k": 10}).encode()
+                    for _ in range(workers * 4):
+                        request = urllib.request.Request(f"http://127.0.0.1:{port}/search/batch", data=body,
+                                                         headers={"Content-Type": "application/json"})
+                        urllib.request.urlopen(request, timeout=30).read()
+                    infos = [child.memory_full_info() for child in psutil.Process(server.pid).children()]
+                    rss, pss, uss = (sum(getattr(info, field) for info in infos) / len(infos) / 2**20
+                                     for field in ("rss", "pss", "uss"))
+                    total_pss = sum(info.pss for info in infos) / 2**20
+                    print(f"{mode:<16} {workers} workers: per worker RSS {rss:.0f} MB, PSS {pss:.0f} MB, "
+                          f"USS {uss:.0f} MB; total PSS {total_pss:.0f} MB")
+                finally:
+                    server.terminate()
+                    server.wait()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(workdir + "_reports", ignore_errors=True)
+
+
+BENCHMARKS = {
+    "crawl": bench_crawl,
+    "recrawl": bench_recrawl,
+    "pdf": bench_pdf,
+    "docstore": bench_docstore,
+    "index": bench_index,
+    "lexical": bench_lexical,
+    "batch": bench_batch,
+    "chat": bench_chat,
+    "coalescing": bench_coalescing,
+    "workers": bench_workers,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"\n⏱️ {name}")
+        BENCHMARKS[name]()
@@ -0,0 +1,117 @@
+import os
+import json
+import glob
+import time
+import cProfile
+import threading
+import psutil
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+BUILD_REPORT_DIR = os.getenv("BUILD_REPORT_DIR", "build_reports")
+BUILD_PROFILE = os.getenv("BUILD_PROFILE", "") == "1"
+RSS_SAMPLE_INTERVAL = 0.05  # seconds
+
+
+class RssSampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.process = psutil.Process()
+        self.peak = self.process.memory_info().rss
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(RSS_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return max(self.peak, self.process.memory_info().rss)
+
+
+class BuildReport:
+    def __init__(self, name, report_dir=BUILD_REPORT_DIR, profile=BUILD_PROFILE):
+        self.name = name
+        self.report_dir = report_dir
+        self.started_at = datetime.now(timezone.utc)
+        self.stages = []
+        self.profiler = cProfile.Profile() if profile else None
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        if self.profiler:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler:
+            self.profiler.disable()
+        self.write(failed=exc_type is not None)
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        stats = {"items": None, "bytes": None}
+        sampler = RssSampler()
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            seconds = time.perf_counter() - started
+            peak_rss = sampler.stop()
+            items = stats["items"]
+            entry = {
+                "stage": name,
+                "seconds": round(seconds, 4),
+                "items": items,
+                "items_per_second": round(items / seconds, 2) if items is not None and seconds else None,
+                "bytes": stats["bytes"],
+                "peak_rss_mb": round(peak_rss / 2**20, 1),
+            }
+            self.stages.append(entry)
+            rate = f", {entry['items_per_second']:,} items/s" if entry["items_per_second"] is not None else ""
+            print(f"⏱️ {name}: {seconds:.2f}s{rate}, peak RSS {entry['peak_rss_mb']} MB")
+
+    def previous_report(self):
+        paths = sorted(glob.glob(os.path.join(self.report_dir, f"{self.name}-*.json")), key=os.path.getmtime)
+        if not paths:
+            return None
+        with open(paths[-1], "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def write(self, failed=False):
+        os.makedirs(self.report_dir, exist_ok=True)
+        previous = self.previous_report()
+        # Microseconds plus a counter, so builds started close together never share a report.
+        stamp = self.started_at.strftime("%Y%m%dT%H%M%S.%fZ")
+        base, n = os.path.join(self.report_dir, f"{self.name}-{stamp}"), 1
+        while os.path.exists(base + ".json"):
+            n += 1
+            base = os.path.join(self.report_dir, f"{self.name}-{stamp}-{n}")
+        report = {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "failed": failed,
+            "stages": self.stages,
+        }
+        if self.profiler:
+            self.profiler.dump_stats(base + ".prof")
+            report["profile"] = base + ".prof"
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print(f"📊 Build report written to '{base}.json' ({report['total_seconds']:.1f}s total)")
+        if previous:
+            before = {stage["stage"]: stage["seconds"] for stage in previous["stages"]}
+            for stage in self.stages:
+                old = before.get(stage["stage"])
+                if old:
+                    print(f"   {stage['stage']}: {old:.2f}s → {stage['seconds']:.2f}s "
+                          f"({(stage['seconds'] - old) / old:+.0%})")
+        return report
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
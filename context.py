@@ -0,0 +1,130 @@
+import os
+import re
+import time
+import tiktoken
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", "gpt-3.5-turbo")
+MAX_OVERLAP_CHARS = 600  # chunk_overlap is 400; leave room for splitter boundary shifts
+OVERLAP_PROBE_CHARS = 32
+MIN_DEDUP_LINE_CHARS = 30
+MIN_TRUNCATED_TOKENS = 50
+
+CHUNK_POSITION_RE = re.compile(r"::(\d+)$")
+APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+ENCODING_RETRY_SECONDS = 60
+
+loaded_encoding = None
+encoding_failed_at = None
+
+def get_encoding():
+    """The tiktoken encoding, or None while it can't be loaded.
+
+    Only a successful lookup is kept: a failed one is retried at most every
+    ENCODING_RETRY_SECONDS, so a host that was offline at startup recovers.
+    """
+    global loaded_encoding, encoding_failed_at
+    if loaded_encoding is None and (encoding_failed_at is None or
+                                    time.monotonic() - encoding_failed_at >= ENCODING_RETRY_SECONDS):
+        try:
+            loaded_encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+        except Exception as e:
+            # tiktoken downloads its BPE file on first use; offline hosts fall back to a word count.
+            if encoding_failed_at is None:
+                print(f"⚠️ Tokenizer for '{TOKENIZER_MODEL}' unavailable ({e}); approximating token counts.")
+            encoding_failed_at = time.monotonic()
+    return loaded_encoding
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return len(APPROX_TOKEN_RE.findall(text))
+    return len(encoding.encode(text))
+
+def truncate_tokens(text, max_tokens):
+    encoding = get_encoding()
+    if encoding is None:
+        matches = list(APPROX_TOKEN_RE.finditer(text))
+        return text if len(matches) <= max_tokens else text[:matches[max_tokens].start()]
+    tokens = encoding.encode(text)
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+def merge_overlap(first, second):
+    """Return first+second with their shared span written once, or None if they don't overlap."""
+    probe = second[:OVERLAP_PROBE_CHARS]
+    if not probe:
+        return first
+    search_from = max(0, len(first) - MAX_OVERLAP_CHARS)
+    idx = first.find(probe, search_from)
+    while idx != -1:
+        tail = first[idx:]
+        if second.startswith(tail):
+            return first + second[len(tail):]
+        idx = first.find(probe, idx + 1)
+    return None
+
+def chunk_position(doc):
+    match = CHUNK_POSITION_RE.search(getattr(doc, "id", None) or "")
+    return int(match.group(1)) if match else None
+
+def merge_source_chunks(items):
+    """items: [(doc, score)] from one source -> [(text, best_score)] with overlaps merged."""
+    items = sorted(items, key=lambda item: (chunk_position(item[0]) is None, chunk_position(item[0]) or 0))
+    blocks = []
+    for doc, score in items:
+        text = doc.page_content
+        for i, (block_text, block_score) in enumerate(blocks):
+            merged = merge_overlap(block_text, text) or merge_overlap(text, block_text)
+            if merged is not None:
+                blocks[i] = (merged, min(block_score, score))
+                break
+            if text in block_text:
+                blocks[i] = (block_text, min(block_score, score))
+                break
+        else:
+            blocks.append((text, score))
+    return blocks
+
+def assemble_context(scored_docs, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Merge, dedupe and pack (Document, distance) hits into at most `token_budget` tokens.
+
+    Returns the context string and a stats dict with raw and packed token counts.
+    """
+    raw_tokens = count_tokens("\n".join(doc.page_content for doc, _ in scored_docs))
+    by_source = {}
+    for doc, score in scored_docs:
+        by_source.setdefault(doc.metadata.get("source"), []).append((doc, score))
+    blocks = [block for items in by_source.values() for block in merge_source_chunks(items)]
+    # FAISS returns L2 distances: smaller is more relevant.
+    blocks.sort(key=lambda block: block[1])
+
+    seen_lines = set()
+    parts = []
+    used = 0
+    for text, _ in blocks:
+        lines = []
+        for line in text.split("\n"):
+            key = line.strip()
+            if len(key) >= MIN_DEDUP_LINE_CHARS:
+                if key in seen_lines:
+                    continue
+                seen_lines.add(key)
+            lines.append(line)
+        text = "\n".join(lines).strip()
+        if not text:
+            continue
+        tokens = count_tokens(text)
+        remaining = token_budget - used
+        if tokens > remaining:
+            if remaining < MIN_TRUNCATED_TOKENS:
+                break
+            text = truncate_tokens(text, remaining)
+            tokens = remaining
+        parts.append(text)
+        used += tokens
+    context = "\n\n".join(parts)
+    stats = {"chunks": len(scored_docs), "blocks": len(parts), "raw_tokens": raw_tokens,
+             "tokens": count_tokens(context), "budget": token_budget}
+    stats["tokens_saved"] = max(0, raw_tokens - stats["tokens"])
+    return context, stats
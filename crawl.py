@@ -1,13 +1,52 @@
 import os
+import re
+import json
+import argparse
 import time
-import requests
+import asyncio
+import hashlib
+import itertools
+import aiohttp
+import aiofiles
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urldefrag
+from urllib.robotparser import RobotFileParser
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "16"))
+CRAWL_HOST_RATE = float(os.getenv("CRAWL_HOST_RATE", "8"))  # requests/second per host, 0 = unlimited
+CRAWL_HOST_BURST = int(os.getenv("CRAWL_HOST_BURST", "8"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "10"))
+CRAWL_CHECKPOINT_INTERVAL = float(os.getenv("CRAWL_CHECKPOINT_INTERVAL", "30"))  # seconds
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "2000"))  # 0 = no page budget
+SITEMAP_LIMIT = 50
+SKIP_EXTENSIONS = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".zip", ".rar",
+    ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".mp3", ".mp4", ".css", ".js",
+)
+PAGE_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+# (pattern, weight) pairs added to a URL's priority; higher is crawled sooner.
+URL_PRIORITY_RULES = [
+    (re.compile(p, re.I), w) for p, w in [
+        (r"admission|apply|tuition|fee|scholarship|financial-aid|registration|register", 1.0),
+        (r"faq|student|program|programme|course|college|housing|visa|transfer", 0.5),
+        (r"calendar|event|news|gallery|media|tag/|category/|/page/\d+|archive", -1.0),
+        (r"\?", -0.5),
+    ]
+]
+GONE_STATUSES = (404, 410)  # the page was removed, as opposed to a transient failure
+MANIFEST_FILE = "manifest.json"
+CHECKPOINT_FILE = ".checkpoint.json"
 
 def is_internal_link(link, base_netloc):
     parsed = urlparse(link)
     return parsed.netloc == '' or parsed.netloc == base_netloc
 
+def is_skipped_file(url):
+    return urlparse(url).path.lower().endswith(SKIP_EXTENSIONS)
+
 def safe_filename_from_url(url):
     parsed = urlparse(url)
     path = parsed.netloc + parsed.path
@@ -16,48 +55,425 @@ def safe_filename_from_url(url):
         clean = "index"
     if len(clean) > 100:
         clean = clean[:100]
+    if parsed.query:
+        # /news and /news?page=2 are different pages; keep them in different files.
+        clean += "_" + hashlib.sha1(parsed.query.encode("utf-8")).hexdigest()[:10]
     return clean + ".txt"
 
-def crawl(url, base_url, output_dir, visited, depth=1):
-    if url in visited or depth <= 0:
-        return
-    print(f"\n🔗 Crawling: {url}")
-    visited.add(url)
-    try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        text = soup.get_text(separator='\n', strip=True)
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_json_atomic(path, data, **dump_kwargs):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+def load_manifest(output_dir):
+    return read_json(os.path.join(output_dir, MANIFEST_FILE), {})
+
+def save_manifest(output_dir, manifest):
+    write_json_atomic(os.path.join(output_dir, MANIFEST_FILE), manifest, indent=1, sort_keys=True)
+
+def load_checkpoint(output_dir):
+    return read_json(os.path.join(output_dir, CHECKPOINT_FILE), None)
+
+def clear_checkpoint(output_dir):
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+
+def url_priority(url, sitemap_priority=None, lastmod=None):
+    score = sitemap_priority if sitemap_priority is not None else 0.5
+    score += sum(weight for pattern, weight in URL_PRIORITY_RULES if pattern.search(url))
+    if lastmod:
+        try:
+            modified = datetime.fromisoformat(lastmod[:10]).replace(tzinfo=timezone.utc)
+            if (datetime.now(timezone.utc) - modified).days < 365:
+                score += 0.25
+        except ValueError:
+            pass
+    return score
+
+def parse_sitemap(xml_text):
+    """Return (urls, child_sitemaps); urls are (loc, priority, lastmod) tuples."""
+    root = ET.fromstring(xml_text)
+    urls, sitemaps = [], []
+    for element in root:
+        fields = {child.tag.rsplit("}", 1)[-1]: (child.text or "").strip() for child in element}
+        loc = fields.get("loc")
+        if not loc:
+            continue
+        if element.tag.endswith("sitemap"):
+            sitemaps.append(loc)
+        else:
+            try:
+                priority = float(fields["priority"]) if fields.get("priority") else None
+            except ValueError:
+                priority = None
+            urls.append((loc, priority, fields.get("lastmod")))
+    return urls, sitemaps
+
+def extract_page(html, page_url, base_netloc):
+    soup = BeautifulSoup(html, 'html.parser')
+    text = soup.get_text(separator='\n', strip=True)
+    links = []
+    for a_tag in soup.find_all('a', href=True):
+        href = a_tag['href'].strip()
+        if not href.startswith(('http://', 'https://', '/')):
+            continue
+        full_link, _ = urldefrag(urljoin(page_url, href))
+        if is_skipped_file(full_link):
+            continue
+        if is_internal_link(full_link, base_netloc):
+            links.append(full_link)
+    return text, links
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Crawler:
+    def __init__(self, start_url, output_dir="crawl", depth=2, concurrency=CRAWL_CONCURRENCY,
+                 host_rate=CRAWL_HOST_RATE, host_burst=CRAWL_HOST_BURST,
+                 checkpoint_interval=CRAWL_CHECKPOINT_INTERVAL, max_pages=CRAWL_MAX_PAGES,
+                 use_sitemaps=True, on_page=None, write_files=True):
+        self.start_url = urldefrag(start_url)[0]
+        self.base_netloc = urlparse(self.start_url).netloc
+        self.output_dir = output_dir
+        self.depth = depth
+        self.concurrency = concurrency
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.checkpoint_interval = checkpoint_interval
+        self.max_pages = max_pages
+        self.use_sitemaps = use_sitemaps
+        self.on_page = on_page  # optional `async def on_page(url, filename, text)` hook
+        self.write_files = write_files
+        self.robots = None
+        self.visited = set()
+        self.status = {}
+        self.buckets = {}
+        self.queue = None
+        self.sequence = itertools.count()
+        self.started = 0
+        self.pages = 0
+        self.bytes = 0
+        self.errors = 0
+        self.previous = load_manifest(output_dir)
+        self.manifest = {}
+        self.failed = set()
+        self.gone = set()
+        self.changes = {"added": [], "changed": [], "unchanged": [], "removed": []}
+
+    def bucket_for(self, url):
+        host = urlparse(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.host_rate, self.host_burst)
+        return self.buckets[host]
+
+    def enqueue(self, url, depth, sitemap_priority=None, lastmod=None):
+        if url in self.visited or depth <= 0:
+            return
+        if self.robots and not self.robots.can_fetch(USER_AGENT, url):
+            return
+        self.visited.add(url)
+        # Links found deeper in the site wait slightly longer than the pages linking to them.
+        score = url_priority(url, sitemap_priority, lastmod) - 0.1 * (self.depth - depth)
+        self.status[url] = ["queued", depth, score]
+        self.queue.put_nowait((-score, next(self.sequence), url, depth))
+
+    async def get_text(self, session, url):
+        await self.bucket_for(url).acquire()
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return None
+                return await response.text(errors="replace")
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+    async def load_robots(self, session):
+        parsed = urlparse(self.start_url)
+        robots_text = await self.get_text(session, f"{parsed.scheme}://{parsed.netloc}/robots.txt")
+        if robots_text is None:
+            return
+        self.robots = RobotFileParser()
+        self.robots.parse(robots_text.splitlines())
+        delay = self.robots.crawl_delay(USER_AGENT)
+        if delay:
+            self.host_rate = min(self.host_rate, 1 / float(delay)) if self.host_rate > 0 else 1 / float(delay)
+            self.host_burst = 1
+            self.buckets.clear()
+            print(f"🤖 robots.txt asks for a {delay}s crawl delay")
+
+    async def seed_from_sitemaps(self, session):
+        parsed = urlparse(self.start_url)
+        pending = list((self.robots and self.robots.site_maps()) or [f"{parsed.scheme}://{parsed.netloc}/sitemap.xml"])
+        seen = set()
+        seeded = 0
+        while pending and len(seen) < SITEMAP_LIMIT:
+            sitemap_url = pending.pop()
+            if sitemap_url in seen:
+                continue
+            seen.add(sitemap_url)
+            xml_text = await self.get_text(session, sitemap_url)
+            if not xml_text:
+                continue
+            try:
+                urls, children = parse_sitemap(xml_text)
+            except ET.ParseError as e:
+                print(f"⚠️ Could not parse sitemap {sitemap_url}: {e}")
+                continue
+            pending.extend(children)
+            for loc, priority, lastmod in urls:
+                loc = urldefrag(loc)[0]
+                if is_skipped_file(loc):
+                    continue
+                if is_internal_link(loc, self.base_netloc) and loc not in self.visited:
+                    self.enqueue(loc, self.depth, priority, lastmod)
+                    seeded += 1
+        print(f"🗺️ Seeded {seeded} URLs from {len(seen)} sitemap(s)")
+
+    def restore(self, checkpoint):
+        self.start_url = checkpoint["start_url"]
+        self.base_netloc = urlparse(self.start_url).netloc
+        self.depth = checkpoint["depth"]
+        self.manifest = checkpoint["manifest"]
+        self.changes = checkpoint["changes"]
+        self.pages = checkpoint["pages"]
+        for url, (status, depth, score) in checkpoint["status"].items():
+            # Pages that failed or were in flight when the last run stopped are fetched again.
+            self.status[url] = ["done" if status == "done" else "queued", depth, score]
+            self.visited.add(url)
+        done = sum(1 for status, _, _ in self.status.values() if status == "done")
+        self.started = done
+        print(f"⏯️ Resuming crawl of {self.start_url}: {done} pages done, {len(self.status) - done} pending")
+
+    def save_checkpoint(self):
+        write_json_atomic(os.path.join(self.output_dir, CHECKPOINT_FILE), {
+            "start_url": self.start_url,
+            "depth": self.depth,
+            "status": self.status,
+            "manifest": self.manifest,
+            "changes": self.changes,
+            "pages": self.pages,
+        }, separators=(",", ":"))
+
+    async def checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            self.save_checkpoint()
+
+    def conditional_headers(self, url):
+        entry = self.previous.get(url)
+        if not entry or not entry.get("file") or not os.path.exists(os.path.join(self.output_dir, entry["file"])):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    async def fetch(self, session, url, depth):
+        await self.bucket_for(url).acquire()
+        print(f"🔗 Crawling: {url}")
+        try:
+            async with session.get(url, headers=self.conditional_headers(url)) as response:
+                not_modified = response.status == 304
+                if not not_modified:
+                    response.raise_for_status()
+                    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                    if content_type and content_type not in PAGE_CONTENT_TYPES:
+                        print(f"⏭️ Skipping {url}: {content_type}")
+                        return
+                    html = await response.text(errors="replace")
+                    self.bytes += len(html)
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.errors += 1
+            self.failed.add(url)
+            if isinstance(e, aiohttp.ClientResponseError) and e.status in GONE_STATUSES:
+                self.gone.add(url)
+            print(f"❌ Error fetching {url}: {e}")
+            return
+        if not_modified:
+            entry = self.previous[url]
+            self.manifest[url] = entry
+            self.changes["unchanged"].append(entry["file"])
+            self.pages += 1
+            if self.on_page:
+                async with aiofiles.open(os.path.join(self.output_dir, entry["file"]), "r", encoding="utf-8") as f:
+                    await self.on_page(url, entry["file"], await f.read())
+            for link in entry.get("links", []):
+                self.enqueue(link, depth - 1)
+            return
+        text, links = await asyncio.to_thread(extract_page, html, url, self.base_netloc)
         filename = safe_filename_from_url(url)
-        filepath = os.path.join(output_dir, filename)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(text)
-        print(f"\n📄 Preview of {filename}:\n")
-        print('\n'.join(text.split('\n')[:20]))
-        base_netloc = urlparse(base_url).netloc
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href'].strip()
-            if not href.startswith(('http://', 'https://', '/')):
+        digest = text_hash(text)
+        previous = self.previous.get(url)
+        filepath = os.path.join(self.output_dir, filename)
+        on_disk = os.path.exists(filepath)
+        unchanged = previous is not None and previous["sha256"] == digest
+        if unchanged and (on_disk or not self.write_files):
+            self.changes["unchanged"].append(filename)
+        else:
+            if self.write_files:
+                async with aiofiles.open(filepath, "w", encoding="utf-8") as f:
+                    await f.write(text)
+            self.changes["changed" if previous else "added"].append(filename)
+        entry = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": digest,
+            "links": links,
+        }
+        # "file" is only recorded while the file on disk holds this exact text.
+        if self.write_files or (unchanged and on_disk):
+            entry["file"] = filename
+        self.manifest[url] = entry
+        self.pages += 1
+        if self.on_page:
+            await self.on_page(url, filename, text)
+        for link in links:
+            self.enqueue(link, depth - 1)
+
+    def finish(self):
+        for url, entry in self.previous.items():
+            # Pages still linked from the site but not fetched (transient errors, page budget) are kept;
+            # pages that answered 404/410 are dropped like unlinked ones.
+            if url not in self.manifest and url in self.visited and url not in self.gone:
+                self.manifest[url] = entry
+        # A file goes only once no surviving page references it (pages can also move to a new file name).
+        live = {entry.get("file") for entry in self.manifest.values()}
+        for filename in sorted({entry.get("file") for entry in self.previous.values()} - live - {None}):
+            self.changes["removed"].append(filename)
+            filepath = os.path.join(self.output_dir, filename)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        save_manifest(self.output_dir, self.manifest)
+
+    async def worker(self, session):
+        while True:
+            _, _, url, depth = await self.queue.get()
+            if self.max_pages and self.started >= self.max_pages:
+                self.queue.task_done()
                 continue
-            full_link = urljoin(base_url, href)
-            if is_internal_link(full_link, base_netloc):
-                crawl(full_link, base_url, output_dir, visited, depth=depth - 1)
-        time.sleep(1)
-    except requests.RequestException as e:
-        print(f"❌ Error fetching {url}: {e}")
-
-def run_crawler(start_url, depth=2, output_dir="crawl"):
-    visited = set()
+            self.started += 1
+            try:
+                await self.fetch(session, url, depth)
+                self.status[url][0] = "failed" if url in self.failed else "done"
+            except Exception as e:
+                self.errors += 1
+                self.failed.add(url)
+                self.status[url][0] = "failed"
+                print(f"❌ Error processing {url}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def run(self):
+        self.queue = asyncio.PriorityQueue()
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=CRAWL_TIMEOUT)
+        completed = False
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                             headers={"User-Agent": USER_AGENT}) as session:
+                await self.load_robots(session)
+                if self.status:
+                    for url, (status, depth, score) in self.status.items():
+                        if status == "queued":
+                            self.queue.put_nowait((-score, next(self.sequence), url, depth))
+                else:
+                    self.enqueue(self.start_url, self.depth, sitemap_priority=1.0)
+                    if self.use_sitemaps:
+                        await self.seed_from_sitemaps(session)
+                tasks = [asyncio.create_task(self.worker(session)) for _ in range(self.concurrency)]
+                tasks.append(asyncio.create_task(self.checkpoint_loop()))
+                try:
+                    await self.queue.join()
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+            completed = True
+        finally:
+            if completed:
+                self.finish()
+                clear_checkpoint(self.output_dir)
+            else:
+                self.save_checkpoint()
+                print(f"💾 Crawl interrupted; checkpoint saved to '{self.output_dir}'. Re-run with --resume to continue.")
+
+
+def run_crawler(start_url, depth=2, output_dir="crawl", concurrency=CRAWL_CONCURRENCY,
+                host_rate=CRAWL_HOST_RATE, host_burst=CRAWL_HOST_BURST, resume=False,
+                checkpoint_interval=CRAWL_CHECKPOINT_INTERVAL, max_pages=CRAWL_MAX_PAGES,
+                use_sitemaps=True, on_page=None, write_files=True):
     os.makedirs(output_dir, exist_ok=True)
-    crawl(start_url, start_url, output_dir, visited, depth=depth)
+    crawler = Crawler(start_url, output_dir, depth=depth, concurrency=concurrency,
+                      host_rate=host_rate, host_burst=host_burst,
+                      checkpoint_interval=checkpoint_interval, max_pages=max_pages,
+                      use_sitemaps=use_sitemaps, on_page=on_page, write_files=write_files)
+    checkpoint = load_checkpoint(output_dir)
+    if resume and checkpoint:
+        crawler.restore(checkpoint)
+    elif resume:
+        print("⚠️ No checkpoint found; starting a fresh crawl.")
+    started = time.perf_counter()
+    asyncio.run(crawler.run())
+    elapsed = time.perf_counter() - started
+    rate = crawler.pages / elapsed if elapsed else 0.0
+    changes = crawler.changes
+    print(f"✅ Crawled {crawler.pages} pages ({crawler.errors} errors) in {elapsed:.1f}s — {rate:.1f} pages/s")
+    print(f"📝 {len(changes['added'])} added, {len(changes['changed'])} changed, "
+          f"{len(changes['unchanged'])} unchanged, {len(changes['removed'])} removed")
+    return {"pages": crawler.pages, "errors": crawler.errors, "seconds": elapsed,
+            "pages_per_second": rate, "bytes": crawler.bytes, "changes": changes}
 
 if __name__ == "__main__":
-    start_url = input("Enter a base URL to crawl: ").strip()
+    parser = argparse.ArgumentParser(description="Crawl a site into text files.")
+    parser.add_argument("start_url", nargs="?")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--output-dir", default="crawl")
+    parser.add_argument("--resume", action="store_true", help="continue from the last saved checkpoint")
+    parser.add_argument("--max-pages", type=int, default=CRAWL_MAX_PAGES, help="page budget, 0 = unlimited")
+    parser.add_argument("--no-sitemaps", action="store_true", help="only follow links from the start URL")
+    args = parser.parse_args()
+    start_url = args.start_url
+    if not start_url:
+        checkpoint = load_checkpoint(args.output_dir) if args.resume else None
+        start_url = checkpoint["start_url"] if checkpoint else input("Enter a base URL to crawl: ").strip()
     print("\n🚀 Starting crawler...\n")
-    run_crawler(start_url, depth=2)
+    run_crawler(start_url, depth=args.depth, output_dir=args.output_dir, resume=args.resume,
+                max_pages=args.max_pages, use_sitemaps=not args.no_sitemaps)
 
 
 
@@ -1,62 +1,125 @@
 import os
+import json
+import hashlib
 import fitz  # PyMuPDF
+from collections import defaultdict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from langchain.docstore.document import Document
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-from crawl import run_crawler
+from crawl import run_crawler, load_manifest
+from buildstats import BuildReport, dir_size
+from dedup import dedupe_documents, save_dedup_state
+from embed_cache import EmbeddingCache, CachedEmbeddings
+from context import CONTEXT_TOKEN_BUDGET, assemble_context, count_tokens
+from lexical import build_lexical_index
+from faiss_index import INDEX_TYPE, reindex, save_index_meta, load_index_meta, apply_search_params, describe_index
+from store_versions import (
+    resolve_store_path,
+    new_version_dir,
+    write_manifest,
+    read_manifest,
+    set_current_version,
+    prune_versions,
+)
+from docstore import (
+    DOCSTORE_IDS_FILE,
+    save_mmap_vectorstore,
+    load_mmap_vectorstore,
+    has_mmap_docstore,
+)
 
 PDF_FILES = [
     "C:/Users/kinga/Downloads/PymufTest/PDFs/NewStudentFAQs.pdf",
     "C:/Users/kinga/Downloads/PymufTest/PDFs/User Guide - Faculty Members and Staff.pdf"
 ]
 VECTOR_STORE_PATH = "vectorstore"
+# Stores searched together at query time, e.g. "vectorstore,student_faiss_index"
+VECTOR_STORE_PATHS = [path for path in os.getenv("VECTOR_STORE_PATHS", VECTOR_STORE_PATH).split(",") if path]
+SOURCE_MAP_FILE = "sources.json"
+DOCSTORE_FORMAT = os.getenv("DOCSTORE_FORMAT", "mmap")  # "mmap" or "pickle"
 EMBED_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
-def custom_loader_concat_blocks_and_text(pdf_path):
-    doc = fitz.open(pdf_path)
-    docs = []
-    for page_num, page in enumerate(doc):
-        text_text = page.get_text("text").strip()
-        block_text = "\n".join(
-            block[4].strip()
-            for block in sorted(page.get_text("blocks"), key=lambda b: (b[1], b[0]))
-            if block[4].strip()
-        )
-        combined = text_text
-        if block_text and block_text not in text_text:
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = 16
+
+def extract_page_text(page):
+    text_text = page.get_text("text").strip()
+    block_text = "\n".join(
+        block[4].strip()
+        for block in sorted(page.get_text("blocks"), key=lambda b: (b[1], b[0]))
+        if block[4].strip()
+    )
+    combined = text_text
+    if block_text:
+        text_lines = set(line.strip() for line in text_text.split("\n"))
+        if any(line.strip() not in text_lines for line in block_text.split("\n")):
             combined += "\n" + block_text
-        paragraphs = []
-        for para in combined.split("\n\n"):
-            para = para.strip()
-            if para and para not in paragraphs:
-                paragraphs.append(para)
-        combined_text = "\n\n".join(paragraphs)
-        if combined_text.strip():
-            docs.append(Document(
-                page_content=combined_text.strip(),
-                metadata={"source": pdf_path, "page": page_num+1}
-            ))
-    doc.close()
-    return docs
+    paragraphs = []
+    seen = set()
+    for para in combined.split("\n\n"):
+        para = para.strip()
+        if para and para not in seen:
+            seen.add(para)
+            paragraphs.append(para)
+    return "\n\n".join(paragraphs).strip()
 
-def load_pdfs(pdf_files):
-    documents = []
+def extract_pdf_pages(pdf_path, start, stop):
+    doc = fitz.open(pdf_path)
+    try:
+        return [(page_num, extract_page_text(doc[page_num])) for page_num in range(start, stop)]
+    finally:
+        doc.close()
+
+def pages_to_documents(pdf_path, pages):
+    return [
+        Document(page_content=text, metadata={"source": pdf_path, "page": page_num+1})
+        for page_num, text in pages
+        if text
+    ]
+
+def custom_loader_concat_blocks_and_text(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    return pages_to_documents(pdf_path, extract_pdf_pages(pdf_path, 0, page_count))
+
+def load_pdfs(pdf_files, workers=PDF_WORKERS):
+    tasks = []
     for pdf_file in pdf_files:
         try:
             print(f"🔍 Loading: {pdf_file}")
-            docs = custom_loader_concat_blocks_and_text(pdf_file)
-            documents.extend(docs)
+            with fitz.open(pdf_file) as doc:
+                page_count = doc.page_count
         except Exception as e:
             print(f"⚠️ Failed to load '{pdf_file}': {e}")
+            continue
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            tasks.append((pdf_file, start, min(start + PDF_PAGES_PER_TASK, page_count)))
+    documents = []
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(tasks))) if workers > 1 and len(tasks) > 1 else None
+    try:
+        futures = [pool.submit(extract_pdf_pages, *task) if pool else None for task in tasks]
+        for task, future in zip(tasks, futures):
+            try:
+                pages = future.result() if future else extract_pdf_pages(*task)
+            except Exception as e:
+                print(f"⚠️ Failed to load pages {task[1]+1}-{task[2]} of '{task[0]}': {e}")
+                continue
+            documents.extend(pages_to_documents(task[0], pages))
+    finally:
+        if pool:
+            pool.shutdown()
     print(f"✅ Loaded {len(documents)} total documents.")
     return documents
 
-def load_crawled_txts(output_dir="crawl"):
+def load_crawled_txts(output_dir="crawl", only=None):
     docs = []
-    for fname in os.listdir(output_dir):
-        if fname.endswith(".txt"):
+    names = os.listdir(output_dir) if only is None else sorted(only)
+    for fname in names:
+        if fname.endswith(".txt") and os.path.exists(os.path.join(output_dir, fname)):
             with open(os.path.join(output_dir, fname), "r", encoding="utf-8") as f:
                 content = f.read().strip()
                 if content:
@@ -67,55 +130,186 @@ def load_crawled_txts(output_dir="crawl"):
     print(f"🌐 Loaded {len(docs)} crawled text documents.")
     return docs
 
-def split_text_chunks(documents):
-    splitter = RecursiveCharacterTextSplitter(
+def make_text_splitter():
+    return RecursiveCharacterTextSplitter(
         chunk_size=2000,
         chunk_overlap=400,
         separators=["\n\n", "\n", ".", "!", "?", " "]
     )
+
+def split_text_chunks(documents):
+    splitter = make_text_splitter()
     chunks = splitter.split_documents(documents)
     print(f"🧩 Created {len(chunks)} text chunks.")
     return chunks
 
-def create_vectorstore_from_chunks(chunks):
-    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-    store = FAISS.from_documents(chunks, embedding=embeddings)
+def source_key(metadata):
+    if "page" in metadata:
+        return f"{metadata['source']}#page={metadata['page']}"
+    return metadata["source"]
+
+def assign_chunk_ids(chunks, counters=None):
+    counters = counters if counters is not None else defaultdict(int)
+    ids = []
+    for chunk in chunks:
+        key = source_key(chunk.metadata)
+        ids.append(f"{key}::{counters[key]}")
+        counters[key] += 1
+    return ids
+
+def build_source_map(store):
+    source_map = defaultdict(list)
+    for doc_id in store.index_to_docstore_id.values():
+        source_map[source_key(store.docstore.search(doc_id).metadata)].append(doc_id)
+    return dict(source_map)
+
+def load_source_map(store, path=VECTOR_STORE_PATH):
+    map_path = os.path.join(resolve_store_path(path), SOURCE_MAP_FILE)
+    if os.path.exists(map_path):
+        with open(map_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return build_source_map(store)
+
+@lru_cache(maxsize=None)
+def get_embeddings(model_name=EMBED_MODEL):
+    # Loading the sentence-transformers model takes seconds; every store in the process shares one copy.
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+def create_vectorstore_from_chunks(chunks, index_type=INDEX_TYPE):
+    embeddings = get_embeddings()
+    cached = CachedEmbeddings(embeddings, EmbeddingCache(EMBED_MODEL))
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = cached.embed_documents(texts)
+    cached.cache.save(prune=True)
+    print(f"🧠 Embedded {cached.misses} new chunks, reused {cached.hits} cached embeddings.")
+    store = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings,
+                                  metadatas=[chunk.metadata for chunk in chunks],
+                                  ids=assign_chunk_ids(chunks))
+    reindex(store, index_type)
     print("✅ Vector store created successfully.")
     return store
 
-def save_vectorstore(store, path=VECTOR_STORE_PATH):
-    store.save_local(path)
+def save_vectorstore(store, path=VECTOR_STORE_PATH, source_map=None, lexical_index=None):
+    if DOCSTORE_FORMAT == "mmap":
+        save_mmap_vectorstore(store, path)
+        stale = os.path.join(path, "index.pkl")
+    else:
+        store.save_local(path)
+        stale = os.path.join(path, DOCSTORE_IDS_FILE)
+    if os.path.exists(stale):
+        os.remove(stale)
+    save_index_meta(path, store.index)
+    (lexical_index or build_lexical_index(store)).save(path)
+    with open(os.path.join(path, SOURCE_MAP_FILE), "w", encoding="utf-8") as f:
+        json.dump(source_map if source_map is not None else build_source_map(store), f)
     print(f"💾 Vector store saved to '{path}'")
 
-def load_vectorstore(path=VECTOR_STORE_PATH):
-    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-    store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+def publish_vectorstore(store, root=VECTOR_STORE_PATH, source_map=None, boilerplate=None, simhashes=None,
+                        lexical_index=None, **details):
+    """Save into a new version directory under `root`, then point CURRENT at it.
+
+    Servers keep reading the previous version until they reload; returns the new version's path.
+    `boilerplate` lines and page `simhashes` are kept with the version for later incremental
+    builds; a `lexical_index` that is already up to date is saved instead of rebuilt; extra
+    `details` are recorded in its manifest.
+    """
+    os.makedirs(root, exist_ok=True)
+    version, path = new_version_dir(root)
+    save_vectorstore(store, path, source_map, lexical_index)
+    if boilerplate is not None:
+        save_dedup_state(path, boilerplate, simhashes)
+    write_manifest(path, version, chunks=store.index.ntotal, index=describe_index(store.index),
+                   docstore=DOCSTORE_FORMAT, embed_model=EMBED_MODEL, **details)
+    set_current_version(root, version)
+    print(f"🚀 Published vector store version '{version}'")
+    prune_versions(root)
+    return path
+
+def load_vectorstore(path=VECTOR_STORE_PATH, mmap_index=False):
+    path = resolve_store_path(path)
+    embeddings = get_embeddings()
+    if has_mmap_docstore(path):
+        store = load_mmap_vectorstore(path, embeddings, mmap_index)
+    else:
+        if mmap_index:
+            print(f"⚠️ '{path}' is a pickled store; its index is read into memory, not mapped.")
+        store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    apply_search_params(store.index, load_index_meta(path))
     print(f"📦 Vector store loaded from '{path}'")
     return store
 
-def get_relevant_context(user_input, vectorstore, k=10):
-    results = vectorstore.similarity_search(user_input, k=k)
+def get_relevant_context(user_input, retriever, k=10, token_budget=CONTEXT_TOKEN_BUDGET, reranker=None):
+    if reranker is not None:
+        candidates = retriever.search(user_input, k=max(k, reranker.fetch_k))
+        results, rerank_stats = reranker.rerank(user_input, candidates)
+        # What the prompt would have carried without the second stage, to weigh against reranking time.
+        baseline_tokens = count_tokens("\n".join(doc.page_content for doc, _ in candidates[:k]))
+        kept_tokens = count_tokens("\n".join(doc.page_content for doc, _ in results))
+        print(f"🎯 Reranked {rerank_stats['candidates']} → {rerank_stats['kept']} chunks in "
+              f"{rerank_stats['seconds'] * 1000:.0f}ms; prompt chunks {baseline_tokens} → {kept_tokens} tokens "
+              f"vs top-{k}")
+    else:
+        results = retriever.search(user_input, k=k)
     if not results:
         print("⚠️ No relevant context found.")
         return ""
     print(f"🔎 Retrieved {len(results)} relevant context chunks for: '{user_input}'")
-    return "\n".join(doc.page_content for doc in results)
+    context, stats = assemble_context(results, token_budget)
+    print(f"✂️ Context: {stats['raw_tokens']} → {stats['tokens']} tokens "
+          f"({stats['tokens_saved']} saved, {stats['blocks']} blocks, budget {stats['budget']})")
+    return context
 
-def create_and_save_vectorstore_with_crawl(base_url, pdf_files=PDF_FILES):
-    print("📄 Starting vector store creation...")
+def sources_fingerprint(pdf_files, output_dir="crawl"):
+    """Hash of everything a full build reads: each crawled page's content hash and each PDF's size and mtime."""
+    pages = {url: entry["sha256"] for url, entry in load_manifest(output_dir).items()}
+    pdfs = []
+    for pdf_path in pdf_files:
+        try:
+            stat = os.stat(pdf_path)
+            pdfs.append([pdf_path, stat.st_size, stat.st_mtime_ns])
+        except FileNotFoundError:
+            pdfs.append([pdf_path, None, None])
+    sources = {"pages": pages, "pdfs": pdfs, "embed_model": EMBED_MODEL}
+    return hashlib.sha256(json.dumps(sources, sort_keys=True).encode("utf-8")).hexdigest()
 
-    # Crawl website for text data
-    print(f"🌐 Crawling website: {base_url}")
-    run_crawler(base_url, depth=2, output_dir="crawl")
-    crawled_docs = load_crawled_txts(output_dir="crawl")
+def create_and_save_vectorstore_with_crawl(base_url, pdf_files=PDF_FILES, force=False):
+    print("📄 Starting vector store creation...")
+    with BuildReport("build") as build:
+        # Crawl website for text data
+        print(f"🌐 Crawling website: {base_url}")
+        with build.stage("run_crawler") as stage:
+            report = run_crawler(base_url, depth=2, output_dir="crawl")
+            stage.update(items=report["pages"], bytes=report["bytes"])
+        # Compared with what the published store was built from, not with the previous crawl: the crawl
+        # manifest is written before ingest, so a build that failed after it must not look up to date.
+        sources = sources_fingerprint(pdf_files, output_dir="crawl")
+        published = read_manifest(resolve_store_path(VECTOR_STORE_PATH))
+        if not force and published and published.get("sources") == sources:
+            print("♻️ No crawled pages or PDFs changed since the last build; keeping the existing vector store.")
+            return load_vectorstore()
+        with build.stage("load_crawled_txts") as stage:
+            crawled_docs = load_crawled_txts(output_dir="crawl")
+            stage.update(items=len(crawled_docs), bytes=sum(len(doc.page_content) for doc in crawled_docs))
+        with build.stage("dedupe_documents") as stage:
+            crawled_docs, dedup_report = dedupe_documents(crawled_docs)
+            stage.update(items=dedup_report["docs_in"], bytes=dedup_report["chars_in"])
 
-    # Load PDFs
-    pdf_docs = load_pdfs(pdf_files)
-    all_docs = pdf_docs + crawled_docs
+        # Load PDFs
+        with build.stage("load_pdfs") as stage:
+            pdf_docs = load_pdfs(pdf_files)
+            stage.update(items=len(pdf_docs), bytes=sum(os.path.getsize(p) for p in pdf_files if os.path.exists(p)))
+        all_docs = pdf_docs + crawled_docs
 
-    chunks = split_text_chunks(all_docs)
-    store = create_vectorstore_from_chunks(chunks)
-    save_vectorstore(store)
+        with build.stage("split_text_chunks") as stage:
+            chunks = split_text_chunks(all_docs)
+            stage.update(items=len(chunks), bytes=sum(len(chunk.page_content) for chunk in chunks))
+        with build.stage("create_vectorstore_from_chunks") as stage:
+            store = create_vectorstore_from_chunks(chunks)
+            stage.update(items=len(chunks))
+        with build.stage("save_vectorstore") as stage:
+            path = publish_vectorstore(store, sources=sources, boilerplate=dedup_report["lines"],
+                                       simhashes=dedup_report["simhashes"])
+            stage.update(items=store.index.ntotal, bytes=dir_size(path))
     return store
 
 if __name__ == "__main__":
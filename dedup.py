@@ -0,0 +1,128 @@
+import os
+import re
+import json
+import hashlib
+from collections import Counter, defaultdict
+from langchain.docstore.document import Document
+
+BOILERPLATE_MIN_FRACTION = float(os.getenv("DEDUP_BOILERPLATE_FRACTION", "0.3"))
+BOILERPLATE_MIN_DOCS = int(os.getenv("DEDUP_BOILERPLATE_MIN_DOCS", "3"))
+SIMHASH_MAX_DISTANCE = int(os.getenv("DEDUP_SIMHASH_DISTANCE", "3"))
+SHINGLE_SIZE = 3
+DEDUP_STATE_FILE = "dedup.json"  # saved with each store version
+
+WORD_RE = re.compile(r"\w+")
+
+def find_boilerplate_lines(docs, min_fraction=BOILERPLATE_MIN_FRACTION, min_docs=BOILERPLATE_MIN_DOCS):
+    doc_freq = Counter()
+    for doc in docs:
+        doc_freq.update(set(line.strip() for line in doc.page_content.split("\n") if line.strip()))
+    threshold = max(min_docs, min_fraction * len(docs))
+    return {line for line, count in doc_freq.items() if count >= threshold}
+
+def save_dedup_state(path, boilerplate, simhashes=None):
+    with open(os.path.join(path, DEDUP_STATE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"boilerplate": sorted(boilerplate), "simhashes": simhashes or {}}, f, ensure_ascii=False)
+
+def load_dedup_state(path):
+    """(boilerplate lines, {source: simhash} of the indexed pages) saved with the store at `path`."""
+    state_path = os.path.join(path, DEDUP_STATE_FILE)
+    if not os.path.exists(state_path):
+        return set(), {}
+    with open(state_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    return set(state["boilerplate"]), state.get("simhashes", {})
+
+def strip_lines(text, lines):
+    return "\n".join(line for line in text.split("\n") if line.strip() not in lines).strip()
+
+def simhash(text):
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    weights = [0] * 64
+    for shingle, count in Counter(shingles).items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+class NearDuplicateFilter:
+    # Pigeonhole banding: two 64-bit hashes within `max_distance` bits agree on at
+    # least one of `max_distance + 1` bands, so only texts sharing a band are compared.
+    def __init__(self, max_distance=SIMHASH_MAX_DISTANCE, hashes=None):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.width = 64 // self.bands
+        self.mask = (1 << self.width) - 1
+        self.buckets = defaultdict(list)  # band key -> [(simhash, source)]
+        self.hashes = {}  # source -> simhash of the kept text
+        for source, h in (hashes or {}).items():
+            self.add(h, source)
+
+    def band_keys(self, h):
+        return [(band, h >> (band * self.width) & self.mask) for band in range(self.bands)]
+
+    def add(self, h, source=None):
+        if source is not None:
+            self.discard(source)
+            self.hashes[source] = h
+        for key in self.band_keys(h):
+            self.buckets[key].append((h, source))
+
+    def discard(self, source):
+        h = self.hashes.pop(source, None)
+        if h is not None:
+            for key in self.band_keys(h):
+                self.buckets[key] = [entry for entry in self.buckets[key] if entry[1] != source]
+
+    def is_duplicate(self, text, source=None):
+        """True if `text` nearly matches a kept text of another source; otherwise keep it."""
+        h = simhash(text)
+        if any(hamming(h, other) <= self.max_distance
+               for key in self.band_keys(h) for other, other_source in self.buckets[key]
+               if source is None or other_source != source):
+            return True
+        self.add(h, source)
+        return False
+
+def drop_near_duplicates(docs, max_distance=SIMHASH_MAX_DISTANCE, dup_filter=None):
+    dup_filter = dup_filter or NearDuplicateFilter(max_distance)
+    kept, dropped = [], []
+    for doc in docs:
+        (dropped if dup_filter.is_duplicate(doc.page_content, doc.metadata.get("source")) else kept).append(doc)
+    return kept, dropped
+
+def dedupe_documents(docs):
+    chars_in = sum(len(doc.page_content) for doc in docs)
+    boilerplate = find_boilerplate_lines(docs)
+    stripped = []
+    for doc in docs:
+        content = strip_lines(doc.page_content, boilerplate)
+        if content:
+            stripped.append(Document(page_content=content, metadata=doc.metadata))
+    chars_stripped = sum(len(doc.page_content) for doc in stripped)
+    dup_filter = NearDuplicateFilter()
+    kept, dropped = drop_near_duplicates(stripped, dup_filter=dup_filter)
+    chars_out = sum(len(doc.page_content) for doc in kept)
+    report = {
+        "docs_in": len(docs),
+        "docs_out": len(kept),
+        "boilerplate_lines": len(boilerplate),
+        "near_duplicates": len(dropped),
+        "chars_in": chars_in,
+        "chars_boilerplate": chars_in - chars_stripped,
+        "chars_duplicate": chars_stripped - chars_out,
+        "chars_out": chars_out,
+        "lines": boilerplate,
+        "simhashes": dup_filter.hashes,
+    }
+    removed = 1 - chars_out / chars_in if chars_in else 0.0
+    print(f"🧹 Dedup: {len(boilerplate)} boilerplate lines, {len(dropped)} near-duplicate pages dropped; "
+          f"{len(docs)} → {len(kept)} docs, {chars_in:,} → {chars_out:,} chars ({removed:.0%} removed)")
+    return kept, report
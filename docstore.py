@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import mmap
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_community.docstore.base import Docstore, AddableMixin
+from langchain_community.vectorstores import FAISS
+
+from faiss_index import read_index
+
+DOCSTORE_DATA_FILE = "docstore.bin"
+DOCSTORE_OFFSETS_FILE = "docstore.offsets.npy"
+DOCSTORE_IDS_FILE = "docstore.ids.json"
+INDEX_FILE = "index.faiss"
+
+
+class MmapDocstore(Docstore, AddableMixin):
+    """Read-only, memory-mapped chunk text with an in-memory overlay for edits.
+
+    Record i of docstore.bin is the JSON `[page_content, metadata]` of ids[i] and
+    spans offsets[i]:offsets[i + 1]; only the records of search hits are decoded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.added = {}
+        self.deleted = set()
+        self.data = None
+        self.file = None
+        self.open()
+
+    def open(self):
+        with open(os.path.join(self.path, DOCSTORE_IDS_FILE), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.offsets = np.load(os.path.join(self.path, DOCSTORE_OFFSETS_FILE), mmap_mode="r")
+        self.file = open(os.path.join(self.path, DOCSTORE_DATA_FILE), "rb")
+        if self.offsets[-1] > 0:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.offsets = None
+        self.file.close()
+
+    def read(self, row, doc_id):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        page_content, metadata = json.loads(self.data[start:end])
+        return Document(id=doc_id, page_content=page_content, metadata=metadata)
+
+    def search(self, search):
+        if search in self.added:
+            return self.added[search]
+        row = self.rows.get(search)
+        if row is None or search in self.deleted:
+            return f"ID {search} not found."
+        return self.read(row, search)
+
+    def add(self, texts):
+        overlapping = [doc_id for doc_id in texts if doc_id in self.added or
+                       (doc_id in self.rows and doc_id not in self.deleted)]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self.added.update(texts)
+
+    def delete(self, ids):
+        for doc_id in ids:
+            if self.added.pop(doc_id, None) is None:
+                if doc_id not in self.rows or doc_id in self.deleted:
+                    raise ValueError(f"ID {doc_id} not found.")
+                self.deleted.add(doc_id)
+
+
+def write_docstore(path, docstore, ids):
+    data_path = os.path.join(path, DOCSTORE_DATA_FILE)
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    mapped = isinstance(docstore, MmapDocstore) and docstore.data is not None
+    with open(data_path + ".tmp", "wb") as f:
+        for row, doc_id in enumerate(ids):
+            old_row = docstore.rows.get(doc_id) if mapped and doc_id not in docstore.added else None
+            if old_row is not None:
+                # Unchanged records are copied as bytes; only overlay edits are encoded.
+                record = docstore.data[int(docstore.offsets[old_row]):int(docstore.offsets[old_row + 1])]
+            else:
+                doc = docstore.search(doc_id)
+                record = json.dumps([doc.page_content, doc.metadata], ensure_ascii=False).encode("utf-8")
+            f.write(record)
+            offsets[row + 1] = offsets[row] + len(record)
+    # Windows cannot replace a file that is still mapped, so let go of our own mapping first.
+    reopen = isinstance(docstore, MmapDocstore) and os.path.abspath(docstore.path) == os.path.abspath(path)
+    if reopen:
+        docstore.close()
+    np.save(os.path.join(path, DOCSTORE_OFFSETS_FILE + ".tmp.npy"), offsets)
+    os.replace(os.path.join(path, DOCSTORE_OFFSETS_FILE + ".tmp.npy"), os.path.join(path, DOCSTORE_OFFSETS_FILE))
+    with open(os.path.join(path, DOCSTORE_IDS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    os.replace(os.path.join(path, DOCSTORE_IDS_FILE + ".tmp"), os.path.join(path, DOCSTORE_IDS_FILE))
+    os.replace(data_path + ".tmp", data_path)
+    if reopen:
+        docstore.added, docstore.deleted = {}, set()
+        docstore.open()
+
+def save_mmap_vectorstore(store, path):
+    os.makedirs(path, exist_ok=True)
+    ids = [store.index_to_docstore_id[i] for i in range(len(store.index_to_docstore_id))]
+    faiss.write_index(store.index, os.path.join(path, INDEX_FILE))
+    write_docstore(path, store.docstore, ids)
+
+def load_mmap_vectorstore(path, embeddings, mmap_index=False):
+    index = read_index(os.path.join(path, INDEX_FILE), mmap=mmap_index)
+    docstore = MmapDocstore(path)
+    index_to_docstore_id = dict(enumerate(docstore.ids))
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+def has_mmap_docstore(path):
+    return os.path.exists(os.path.join(path, DOCSTORE_IDS_FILE))
+
+
+if __name__ == "__main__":
+    # Convert a pickled store (index.pkl) in place: python docstore.py vectorstore
+    from data import load_vectorstore
+    path = sys.argv[1] if len(sys.argv) > 1 else "vectorstore"
+    store = load_vectorstore(path)
+    save_mmap_vectorstore(store, path)
+    print(f"💾 Wrote memory-mappable docstore for {store.index.ntotal} chunks to '{path}'")
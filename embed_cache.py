@@ -0,0 +1,141 @@
+import os
+import re
+import json
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "embed_cache")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+def text_digest(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Vectors for one embedding model, keyed by the SHA-256 of the chunk text.
+
+    Stored as two append-only raw files (32-byte digests and float32 vectors) plus the vector
+    size in a small JSON file, so a save only appends the new rows and loading is a plain array
+    read with no pickle involved. A full build saves with prune=True, which drops the vectors
+    of chunks that are no longer part of the corpus.
+    """
+
+    def __init__(self, model_name, cache_dir=EMBED_CACHE_DIR):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.keys_path = os.path.join(cache_dir, f"{slug}.keys.bin")
+        self.vectors_path = os.path.join(cache_dir, f"{slug}.vectors.bin")
+        self.meta_path = os.path.join(cache_dir, f"{slug}.json")
+        self.cache_dir = cache_dir
+        self.rows = {}
+        self.keys = np.zeros((0, 32), dtype=np.uint8)
+        self.vectors = None
+        self.new_keys = []
+        self.new_vectors = []
+        self.used = set()  # digests looked up or added by this process
+        if all(os.path.exists(path) for path in (self.keys_path, self.vectors_path, self.meta_path)):
+            self.load()
+        print(f"🗃️ Embedding cache: {len(self.rows)} vectors for '{model_name}'")
+
+    def load(self):
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            dim = json.load(f)["dim"]
+        keys = np.fromfile(self.keys_path, dtype=np.uint8)
+        vectors = np.fromfile(self.vectors_path, dtype=np.float32)
+        count = min(len(keys) // 32, len(vectors) // dim)
+        if len(keys) != count * 32 or len(vectors) != count * dim:
+            # A save was interrupted between the two files; drop the unmatched tail before appending again.
+            for path, size in ((self.keys_path, count * 32), (self.vectors_path, count * dim * 4)):
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        self.keys = keys[:count * 32].reshape(count, 32)
+        self.vectors = vectors[:count * dim].reshape(count, dim)
+        self.rows = {key.tobytes(): row for row, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def vector(self, row):
+        if row < len(self.keys):
+            return self.vectors[row]
+        return self.new_vectors[row - len(self.keys)]
+
+    def get(self, digest):
+        row = self.rows.get(digest)
+        if row is None:
+            return None
+        self.used.add(digest)
+        return self.vector(row)
+
+    def put(self, digest, vector):
+        self.used.add(digest)
+        if digest in self.rows:
+            return
+        self.rows[digest] = len(self.keys) + len(self.new_keys)
+        self.new_keys.append(np.frombuffer(digest, dtype=np.uint8))
+        self.new_vectors.append(np.asarray(vector, dtype=np.float32))
+
+    def save(self, prune=False):
+        """Append new vectors; with `prune`, rewrite the cache with only the vectors used since loading."""
+        if prune and self.used and len(self.used) < len(self.rows):
+            return self.compact()
+        if not self.new_keys:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        new_keys, new_vectors = np.stack(self.new_keys), np.stack(self.new_vectors)
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": new_vectors.shape[1]}, f)
+        # Vectors first: a crash in between leaves extra vectors, which load() trims.
+        with open(self.vectors_path, "ab") as f:
+            f.write(new_vectors.tobytes())
+        with open(self.keys_path, "ab") as f:
+            f.write(new_keys.tobytes())
+        self.keys = np.concatenate([self.keys, new_keys])
+        self.vectors = new_vectors if self.vectors is None else np.concatenate([self.vectors, new_vectors])
+        self.new_keys, self.new_vectors = [], []
+        print(f"💾 Embedding cache saved ({len(self.rows)} vectors, {len(new_keys)} new)")
+
+    def compact(self):
+        digests = [digest for digest in self.rows if digest in self.used]
+        dropped = len(self.rows) - len(digests)
+        keys = np.frombuffer(b"".join(digests), dtype=np.uint8).reshape(len(digests), 32)
+        vectors = np.stack([self.vector(self.rows[digest]) for digest in digests]).astype(np.float32)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": vectors.shape[1]}, f)
+        for path, array in ((self.vectors_path, vectors), (self.keys_path, keys)):
+            with open(path + ".tmp", "wb") as f:
+                f.write(array.tobytes())
+            os.replace(path + ".tmp", path)
+        self.keys, self.vectors = keys, vectors
+        self.rows = {digest: row for row, digest in enumerate(digests)}
+        self.new_keys, self.new_vectors = [], []
+        print(f"💾 Embedding cache saved ({len(self.rows)} vectors, {dropped} unused dropped)")
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, cache, batch_size=EMBED_BATCH_SIZE):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        digests = [text_digest(text) for text in texts]
+        missing = {}
+        for digest, text in zip(digests, texts):
+            if self.cache.get(digest) is None and digest not in missing:
+                missing[digest] = text
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        pending = list(missing.items())
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            vectors = self.embeddings.embed_documents([text for _, text in batch])
+            for (digest, _), vector in zip(batch, vectors):
+                self.cache.put(digest, vector)
+        return [self.cache.get(digest).tolist() for digest in digests]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,127 @@
+import os
+import json
+import math
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivf-flat", "ivf-pq", "sq8", "sq-fp16")
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+INDEX_TRAIN_SAMPLE = int(os.getenv("INDEX_TRAIN_SAMPLE", "10000"))
+INDEX_META_FILE = "index_meta.json"
+# Serve indexes memory-mapped from disk: workers then share one copy through the page cache.
+INDEX_MMAP = os.getenv("INDEX_MMAP", "0") == "1"
+
+def ivf_lists(count):
+    # ~4·sqrt(n) lists, but keep at least ~39 training points per centroid.
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+def index_spec(index_type, count, dim):
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}"
+    if index_type == "ivf-flat":
+        return f"IVF{ivf_lists(count)},Flat"
+    if index_type == "ivf-pq":
+        m = next(m for m in (dim // 8, dim // 4, dim // 2, dim) if m and dim % m == 0)
+        nbits = max(1, min(8, int(math.log2(max(count, 2)))))
+        return f"IVF{ivf_lists(count)},PQ{m}x{nbits}"
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "sq-fp16":
+        return "SQfp16"
+    raise ValueError(f"Unknown index type '{index_type}'; expected one of {', '.join(INDEX_TYPES)}")
+
+def build_index(vectors, index_type=INDEX_TYPE):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    index = faiss.index_factory(dim, index_spec(index_type, count, dim), faiss.METRIC_L2)
+    if not index.is_trained:
+        sample = vectors
+        if count > INDEX_TRAIN_SAMPLE:
+            sample = vectors[np.random.default_rng(0).choice(count, INDEX_TRAIN_SAMPLE, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    apply_search_params(index, {"type": index_type})
+    return index
+
+def describe_index(index):
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return {"type": "hnsw", "ef_search": base.hnsw.efSearch}
+    if isinstance(base, faiss.IndexIVFPQ):
+        return {"type": "ivf-pq", "nprobe": base.nprobe}
+    if isinstance(base, faiss.IndexIVF):
+        return {"type": "ivf-flat", "nprobe": base.nprobe}
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return {"type": "sq-fp16" if base.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"}
+    return {"type": "flat"}
+
+def read_index(path, mmap=False):
+    """Read a saved index, optionally mapped read-only instead of copied onto the heap.
+
+    IO_FLAG_MMAP_IFC maps the codes of flat, SQ and HNSW indexes; IO_FLAG_MMAP maps IVF inverted lists.
+    A mapped index can be searched but not modified.
+    """
+    if mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"⚠️ Cannot memory-map '{path}' ({e}); reading it into memory.")
+    return faiss.read_index(path)
+
+def apply_search_params(index, meta):
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(meta.get("nprobe", IVF_NPROBE), base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = meta.get("ef_search", HNSW_EF_SEARCH)
+
+def save_index_meta(path, index):
+    with open(os.path.join(path, INDEX_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(describe_index(index), f)
+
+def load_index_meta(path):
+    meta_path = os.path.join(path, INDEX_META_FILE)
+    if not os.path.exists(meta_path):
+        return {"type": "flat"}
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def index_vectors(index):
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def reindex(store, index_type=INDEX_TYPE):
+    if describe_index(store.index)["type"] == index_type or store.index.ntotal == 0:
+        return store
+    store.index = build_index(index_vectors(store.index), index_type)
+    print(f"🧭 Rebuilt the FAISS index as '{index_type}'")
+    return store
+
+def delete_ids(store, ids):
+    # FAISS.delete() relies on remove_ids() renumbering the remaining vectors, which
+    # only the flat-code indexes do; IVF keeps sparse labels and HNSW cannot remove.
+    ids = set(ids)
+    positions = {pos for pos, doc_id in store.index_to_docstore_id.items() if doc_id in ids}
+    removed = np.fromiter(positions, dtype=np.int64)
+    base = faiss.downcast_index(store.index)
+    if isinstance(base, faiss.IndexFlatCodes):
+        store.index.remove_ids(removed)
+    else:
+        meta = describe_index(store.index)
+        vectors = index_vectors(store.index)[np.setdiff1d(np.arange(store.index.ntotal), removed)]
+        if isinstance(base, faiss.IndexIVF):
+            base.reset()
+            base.add(vectors)
+        else:
+            store.index = build_index(vectors, meta["type"])
+        apply_search_params(store.index, meta)
+    store.docstore.delete(list(ids))
+    remaining = [doc_id for pos, doc_id in sorted(store.index_to_docstore_id.items()) if pos not in positions]
+    store.index_to_docstore_id = dict(enumerate(remaining))
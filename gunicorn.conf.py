@@ -0,0 +1,20 @@
+# Multi-worker serving: gunicorn -c gunicorn.conf.py main:app
+#
+# The app is imported once in the master with PRELOAD_MODELS=1, so the MiniLM weights and the
+# stores are loaded before the workers fork and shared copy-on-write. With INDEX_MMAP=1 the FAISS
+# index (like the docstore) is mapped from disk, so it stays shared across hot reloads too.
+import gc
+import os
+
+os.environ.setdefault("PRELOAD_MODELS", "1")
+os.environ.setdefault("INDEX_MMAP", "1")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+def when_ready(server):
+    # Keep the collector from touching (and so copying) every preloaded object in each worker.
+    gc.freeze()
@@ -0,0 +1,38 @@
+import os
+from collections import deque
+
+from context import count_tokens
+
+HISTORY_TOKEN_WINDOW = int(os.getenv("HISTORY_TOKEN_WINDOW", "1000"))
+
+
+class ChatHistory:
+    """Past turns of one chat as raw question/answer pairs, bounded by a token window.
+
+    Retrieved context is only ever sent with the current question; older turns that no
+    longer fit the window are dropped, oldest first. The newest turn is always kept, even
+    when it alone exceeds the window, so a follow-up can refer to it.
+    """
+
+    def __init__(self, system_prompt, token_window=HISTORY_TOKEN_WINDOW):
+        self.system_prompt = system_prompt
+        self.token_window = token_window
+        self.turns = deque()  # (question, answer, tokens)
+        self.tokens = 0
+        self.total_turns = 0  # including turns trimmed out of the window
+
+    def add_turn(self, question, answer):
+        tokens = count_tokens(question) + count_tokens(answer)
+        self.turns.append((question, answer, tokens))
+        self.total_turns += 1
+        self.tokens += tokens
+        while len(self.turns) > 1 and self.tokens > self.token_window:
+            self.tokens -= self.turns.popleft()[2]
+
+    def messages(self, current_message):
+        messages = [self.system_prompt]
+        for question, answer, _ in self.turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        messages.append({"role": "user", "content": current_message})
+        return messages
@@ -0,0 +1,98 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from data import VECTOR_STORE_PATHS
+from multi_index import MultiIndexRetriever
+from store_versions import current_version
+
+INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "0"))  # seconds; 0 disables the watcher
+
+
+class RetrieverLease:
+    def __init__(self, retriever):
+        self.retriever = retriever
+        self.active = 0
+        self.retired = False
+
+
+class LiveRetriever:
+    """The retriever the server is currently answering from, swapped atomically on reload.
+
+    Requests hold a lease for as long as they use a retriever; a replaced retriever is closed
+    when its last lease is returned, so two versions are only held while old requests finish.
+    """
+
+    def __init__(self, paths=VECTOR_STORE_PATHS):
+        self.paths = paths
+        self.lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        self.lease = RetrieverLease(MultiIndexRetriever.load(paths))
+        self.held = {}  # retriever -> its lease, while any lease on it is active
+
+    @property
+    def store_versions(self):
+        return self.lease.retriever.store_versions
+
+    @contextmanager
+    def acquire(self, retriever=None):
+        """Lease the current retriever, or take another lease on `retriever`, which the caller
+        already holds (so work it hands off keeps answering from the same version)."""
+        with self.lock:
+            lease = self.lease if retriever is None else self.held.get(retriever)
+            if lease is None:
+                raise RuntimeError("The retriever is no longer leased; it may already be closed.")
+            lease.active += 1
+            self.held[lease.retriever] = lease
+        try:
+            yield lease.retriever
+        finally:
+            with self.lock:
+                lease.active -= 1
+                if lease.active == 0:
+                    del self.held[lease.retriever]
+                release = lease.retired and lease.active == 0
+            if release:
+                self.release(lease)
+
+    def release(self, lease):
+        lease.retriever.close()
+        print(f"🧹 Released retriever for store versions {lease.retriever.store_versions}")
+
+    def published_versions(self):
+        return {shard.name: current_version(shard.path) for shard in self.lease.retriever.shards}
+
+    def reload(self, force=False):
+        """Load the currently published store versions and swap them in; returns True if swapped."""
+        with self.reload_lock:
+            if not force and self.published_versions() == self.store_versions:
+                return False
+            retriever = MultiIndexRetriever.load(self.paths)
+            with self.lock:
+                old, self.lease = self.lease, RetrieverLease(retriever)
+                old.retired = True
+                release = old.active == 0
+            print(f"🔁 Swapped in store versions {retriever.store_versions}")
+            if release:
+                self.release(old)
+            return True
+
+
+class IndexWatcher(threading.Thread):
+    """Polls the CURRENT pointers of the served stores and reloads when a new version is published."""
+
+    def __init__(self, live, interval=INDEX_WATCH_INTERVAL):
+        super().__init__(daemon=True, name="index-watcher")
+        self.live = live
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.live.reload()
+            except Exception as e:
+                print(f"⚠️ Reload failed, still serving {self.live.store_versions}: {e}")
+
+    def stop(self):
+        self.stopped.set()
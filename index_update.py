@@ -0,0 +1,153 @@
+import os
+import argparse
+from langchain.docstore.document import Document
+
+from crawl import run_crawler
+from data import (
+    VECTOR_STORE_PATH,
+    EMBED_MODEL,
+    custom_loader_concat_blocks_and_text,
+    load_crawled_txts,
+    load_vectorstore,
+    publish_vectorstore,
+    make_text_splitter,
+    assign_chunk_ids,
+    source_key,
+    load_source_map,
+)
+from dedup import NearDuplicateFilter, load_dedup_state, strip_lines
+from embed_cache import EmbeddingCache, CachedEmbeddings
+from faiss_index import INDEX_TYPES, delete_ids, reindex
+from lexical import load_lexical_index
+from store_versions import resolve_store_path
+
+
+class IndexUpdater:
+    """Applies source-level edits to a loaded store and publishes them as one new version.
+
+    Edits only touch memory until save(), so a whole `sync` costs one publish. The publish
+    copies unchanged docstore records as bytes and updates the BM25 postings by the changed
+    chunks, instead of re-encoding and re-tokenizing the corpus; the FAISS index is rewritten.
+    """
+
+    def __init__(self, store, path=VECTOR_STORE_PATH):
+        self.store = store
+        self.path = path
+        self.source_map = load_source_map(store, path)
+        self.embeddings = CachedEmbeddings(store.embeddings, EmbeddingCache(EMBED_MODEL))
+        self.splitter = make_text_splitter()
+        resolved = resolve_store_path(path)
+        self.lexical_index = load_lexical_index(resolved)
+        self.removed_ids = set()
+        self.added = {}  # chunk ID -> text, for the BM25 update
+        # Crawled pages go through the same boilerplate and near-duplicate filtering as a full build.
+        self.boilerplate, simhashes = load_dedup_state(resolved)
+        self.dup_filter = NearDuplicateFilter(hashes=simhashes)
+
+    def delete_source(self, key):
+        ids = self.source_map.pop(key, [])
+        self.dup_filter.discard(key)
+        if ids:
+            delete_ids(self.store, ids)
+            for chunk_id in ids:
+                if self.added.pop(chunk_id, None) is None:
+                    self.removed_ids.add(chunk_id)
+            print(f"🗑️ Removed {len(ids)} chunks for '{key}'")
+        return len(ids)
+
+    def upsert_documents(self, docs):
+        for key in {source_key(doc.metadata) for doc in docs}:
+            self.delete_source(key)
+        chunks = self.splitter.split_documents(docs)
+        if not chunks:
+            return 0
+        ids = assign_chunk_ids(chunks)
+        texts = [chunk.page_content for chunk in chunks]
+        self.store.add_embeddings(list(zip(texts, self.embeddings.embed_documents(texts))),
+                                  metadatas=[chunk.metadata for chunk in chunks], ids=ids)
+        for chunk, chunk_id in zip(chunks, ids):
+            self.source_map.setdefault(source_key(chunk.metadata), []).append(chunk_id)
+            self.added[chunk_id] = chunk.page_content
+        print(f"➕ Indexed {len(chunks)} chunks from {len(docs)} document(s)")
+        return len(chunks)
+
+    def upsert_crawled_file(self, fname, output_dir="crawl"):
+        docs = load_crawled_txts(output_dir, only={fname})
+        content = strip_lines(docs[0].page_content, self.boilerplate) if docs else ""
+        if not content:
+            return self.delete_source(fname)
+        if self.dup_filter.is_duplicate(content, fname):
+            print(f"♊ '{fname}' nearly duplicates an indexed page; not indexing it.")
+            self.delete_source(fname)
+            return 0
+        page_hash = self.dup_filter.hashes[fname]
+        count = self.upsert_documents([Document(page_content=content, metadata=docs[0].metadata)])
+        self.dup_filter.add(page_hash, fname)  # upsert_documents dropped it with the old chunks
+        return count
+
+    def upsert_pdf(self, pdf_path):
+        docs = custom_loader_concat_blocks_and_text(pdf_path)
+        current = {source_key(doc.metadata) for doc in docs}
+        for key in [k for k in self.source_map if k.startswith(f"{pdf_path}#page=") and k not in current]:
+            self.delete_source(key)
+        return self.upsert_documents(docs)
+
+    def apply_crawl_changes(self, changes, output_dir="crawl"):
+        for fname in changes["removed"]:
+            self.delete_source(fname)
+        for fname in changes["added"] + changes["changed"]:
+            self.upsert_crawled_file(fname, output_dir)
+
+    def prune(self, output_dir="crawl"):
+        stale = []
+        for key in self.source_map:
+            path = key.split("#page=", 1)[0] if "#page=" in key else os.path.join(output_dir, key)
+            if not os.path.exists(path):
+                stale.append(key)
+        for key in stale:
+            self.delete_source(key)
+        return len(stale)
+
+    def save(self):
+        self.embeddings.cache.save()
+        lexical_index = None
+        if self.lexical_index is not None:
+            lexical_index = self.lexical_index.updated(self.removed_ids, self.added.items())
+        publish_vectorstore(self.store, self.path, self.source_map, boilerplate=self.boilerplate,
+                            simhashes=self.dup_filter.hashes, lexical_index=lexical_index)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the saved vector store in place.")
+    parser.add_argument("--store", default=VECTOR_STORE_PATH)
+    parser.add_argument("--crawl-dir", default="crawl")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upsert = commands.add_parser("upsert", help="add or replace the chunks of crawled files and PDFs")
+    upsert.add_argument("--crawled", nargs="*", default=[], help="file names inside the crawl directory")
+    upsert.add_argument("--pdf", nargs="*", default=[], help="PDF paths, as listed in PDF_FILES")
+    delete = commands.add_parser("delete", help="remove every chunk of the given sources")
+    delete.add_argument("sources", nargs="+")
+    commands.add_parser("prune", help="remove sources whose file no longer exists")
+    sync = commands.add_parser("sync", help="recrawl and apply only the pages that changed")
+    sync.add_argument("base_url")
+    convert = commands.add_parser("reindex", help="rebuild the FAISS index as another index type")
+    convert.add_argument("index_type", choices=INDEX_TYPES)
+    args = parser.parse_args()
+
+    updater = IndexUpdater(load_vectorstore(args.store), args.store)
+    if args.command == "upsert":
+        for fname in args.crawled:
+            updater.upsert_crawled_file(os.path.basename(fname), args.crawl_dir)
+        for pdf_path in args.pdf:
+            updater.upsert_pdf(pdf_path)
+    elif args.command == "delete":
+        for source in args.sources:
+            updater.delete_source(source)
+    elif args.command == "prune":
+        print(f"🧹 Pruned {updater.prune(args.crawl_dir)} stale sources")
+    elif args.command == "sync":
+        report = run_crawler(args.base_url, output_dir=args.crawl_dir)
+        updater.apply_crawl_changes(report["changes"], args.crawl_dir)
+    elif args.command == "reindex":
+        reindex(updater.store, args.index_type)
+    updater.save()
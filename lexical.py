@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import numpy as np
+from collections import Counter
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+BM25_ARRAYS_FILE = "bm25.npz"
+BM25_META_FILE = "bm25.json"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    tokens = TOKEN_RE.findall(text.lower().replace(",", ""))
+    # Course codes are written both "CS 101" and "CS101"; index the joined form too.
+    joined = [a + b for a, b in zip(tokens, tokens[1:]) if a.isalpha() and b.isdigit()]
+    return tokens + joined
+
+
+class BM25Index:
+    """BM25 over chunk texts with CSR postings: the documents containing term t are
+    doc_ids[offsets[t]:offsets[t + 1]], with matching term frequencies in tfs."""
+
+    def __init__(self, terms, ids, offsets, doc_ids, tfs, doc_lengths, k1=BM25_K1, b=BM25_B):
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.ids = ids
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        count = len(ids)
+        df = np.diff(offsets).astype(np.float32)
+        self.idf = np.log(1 + (count - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_lengths.mean()) if count else 1.0
+        self.length_norm = (k1 * (1 - b + b * doc_lengths / avgdl)).astype(np.float32)
+
+    @classmethod
+    def build(cls, items, k1=BM25_K1, b=BM25_B):
+        """items: iterable of (chunk_id, text)."""
+        ids = []
+        postings = {}
+        doc_lengths = []
+        for row, (chunk_id, text) in enumerate(items):
+            tokens = tokenize(text)
+            ids.append(chunk_id)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((row, tf))
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        for i, term in enumerate(terms):
+            rows, counts = zip(*postings[term])
+            doc_ids[offsets[i]:offsets[i + 1]] = rows
+            tfs[offsets[i]:offsets[i + 1]] = counts
+        return cls(terms, ids, offsets, doc_ids, tfs, np.asarray(doc_lengths, dtype=np.float32), k1, b)
+
+    def updated(self, removed_ids, added_items):
+        """A copy without `removed_ids` plus `added_items` ((chunk_id, text) pairs).
+
+        Only the added texts are tokenized; the kept postings are filtered and renumbered as arrays.
+        """
+        removed_ids = set(removed_ids)
+        keep = np.fromiter((chunk_id not in removed_ids for chunk_id in self.ids), dtype=bool, count=len(self.ids))
+        new_row = np.cumsum(keep) - 1
+        posting_terms = np.repeat(np.arange(len(self.terms)), np.diff(self.offsets))
+        kept = keep[self.doc_ids]
+        terms = list(self.terms)
+        vocab = dict(self.vocab)
+        ids = [chunk_id for chunk_id, k in zip(self.ids, keep) if k]
+        doc_lengths = [self.doc_lengths[keep]]
+        added_terms, added_rows, added_tfs, added_lengths = [], [], [], []
+        for chunk_id, text in added_items:
+            tokens = tokenize(text)
+            row = len(ids)
+            ids.append(chunk_id)
+            added_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                if term not in vocab:
+                    vocab[term] = len(terms)
+                    terms.append(term)
+                added_terms.append(vocab[term])
+                added_rows.append(row)
+                added_tfs.append(tf)
+        doc_lengths.append(np.asarray(added_lengths, dtype=np.float32))
+        all_terms = np.concatenate([posting_terms[kept], np.asarray(added_terms, dtype=np.int64)])
+        all_rows = np.concatenate([new_row[self.doc_ids[kept]], np.asarray(added_rows, dtype=np.int64)])
+        all_tfs = np.concatenate([self.tfs[kept], np.asarray(added_tfs, dtype=np.float32)])
+        order = np.argsort(all_terms, kind="stable")
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(all_terms, minlength=len(terms)))
+        return type(self)(terms, ids, offsets, all_rows[order].astype(np.int32), all_tfs[order].astype(np.float32),
+                          np.concatenate(doc_lengths).astype(np.float32), self.k1, self.b)
+
+    def search(self, query, k=10):
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            rows = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            scores[rows] += self.idf[t] * tf * (self.k1 + 1) / (tf + self.length_norm[rows])
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k)[:k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(self.ids[row], float(scores[row])) for row in hits]
+
+    def save(self, path):
+        np.savez(os.path.join(path, BM25_ARRAYS_FILE), offsets=self.offsets, doc_ids=self.doc_ids,
+                 tfs=self.tfs, doc_lengths=self.doc_lengths)
+        with open(os.path.join(path, BM25_META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"terms": self.terms, "ids": self.ids, "k1": self.k1, "b": self.b}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, BM25_META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(os.path.join(path, BM25_ARRAYS_FILE)) as arrays:
+            return cls(meta["terms"], meta["ids"], arrays["offsets"], arrays["doc_ids"], arrays["tfs"],
+                       arrays["doc_lengths"], meta["k1"], meta["b"])
+
+def build_lexical_index(store):
+    items = ((doc_id, store.docstore.search(doc_id).page_content)
+             for _, doc_id in sorted(store.index_to_docstore_id.items()))
+    return BM25Index.build(items)
+
+def load_lexical_index(path):
+    if not os.path.exists(os.path.join(path, BM25_META_FILE)):
+        print(f"⚠️ No lexical index in '{path}'; using vector search only.")
+        return None
+    index = BM25Index.load(path)
+    print(f"🔤 Lexical index loaded ({len(index.ids)} chunks, {len(index.terms)} terms)")
+    return index
@@ -1,21 +1,130 @@
 import os
-from typing import List, Dict, Any
-from fastapi import FastAPI, Form, Request, WebSocket, WebSocketDisconnect
+import time
+import asyncio
+import argparse
+import psutil
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List
+from fastapi import FastAPI, Form, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from openai import OpenAI
+from fastapi.responses import HTMLResponse, JSONResponse
+from pydantic import BaseModel, Field
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from data import (
-    load_vectorstore,
+    VECTOR_STORE_PATHS,
     create_and_save_vectorstore_with_crawl,
+    get_embeddings,
     get_relevant_context,
 )
+from context import get_encoding
+from store_versions import resolve_store_path
+from hot_reload import INDEX_WATCH_INTERVAL, LiveRetriever, IndexWatcher
+from rerank import load_reranker
+from query_cache import query_cache, normalize_query
+from answer_cache import answer_cache, stream_pieces
+from history import ChatHistory
+from singleflight import SingleFlight
 
 load_dotenv()
 
-openai = OpenAI(api_key=os.getenv("OPENAI_API_SECRET_KEY"))
+openai = AsyncOpenAI(api_key=os.getenv("OPENAI_API_SECRET_KEY"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+CRAWL_BASE_URL = os.getenv("CRAWL_BASE_URL", "https://www.ajman.ac.ae/")
+# Load the model and stores at import, i.e. in the gunicorn master before it forks its workers
+# (see gunicorn.conf.py), so all workers share those pages copy-on-write.
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "0") == "1"
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+BATCH_SEARCH_MAX_QUERIES = int(os.getenv("BATCH_SEARCH_MAX_QUERIES", "256"))
+BATCH_SEARCH_MAX_K = int(os.getenv("BATCH_SEARCH_MAX_K", "100"))
 
-app = FastAPI()
+# Embedding, FAISS search and reranking are CPU-bound; they run here so the event loop keeps
+# streaming other chats. The bound keeps a burst of questions from oversubscribing the CPU.
+retrieval_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+async def run_retrieval(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(retrieval_pool, partial(func, *args))
+
+# Filled in by warm_up(); until then the chat endpoints answer 503 and /readyz reports the stage.
+live_retriever = None
+reranker = None
+watcher = None
+startup = {"ready": False, "stage": "starting", "error": None, "stages": [], "seconds_to_ready": None}
+
+def load_stores():
+    """Load the stores to serve. They are never built here: every worker would crawl and publish at once."""
+    missing = [path for path in VECTOR_STORE_PATHS
+               if not os.path.exists(os.path.join(resolve_store_path(path), "index.faiss"))]
+    if missing:
+        raise RuntimeError(f"No vector store at {', '.join(missing)}; build it first with `python main.py --prebuild`")
+    return LiveRetriever(VECTOR_STORE_PATHS)
+
+@contextmanager
+def startup_stage(name):
+    """Time one warm-up stage into startup["stages"], which /readyz reports."""
+    startup["stage"] = name
+    stats = {"items": None}
+    started = time.perf_counter()
+    yield stats
+    seconds = time.perf_counter() - started
+    startup["stages"].append({"stage": name, "seconds": round(seconds, 4), "items": stats["items"],
+                              "rss_mb": round(psutil.Process().memory_info().rss / 2**20, 1)})
+    print(f"⏱️ {name}: {seconds:.2f}s")
+
+def warm_up(query=True):
+    """Load the embedding model, stores and reranker, then run one query so the first user doesn't pay for it.
+
+    Whatever was already preloaded is kept. query=False stops after loading: the preloading master
+    must not run inference, since thread pools started before a fork don't work in the children.
+    """
+    global live_retriever, reranker, watcher
+    try:
+        if live_retriever is None:
+            with startup_stage("load_embedding_model"):
+                get_embeddings()
+            with startup_stage("load_stores") as stats:
+                live = load_stores()
+                stats.update(items=sum(shard.store.index.ntotal for shard in live.lease.retriever.shards))
+            with startup_stage("load_reranker"):
+                loaded_reranker = load_reranker()
+            live_retriever, reranker = live, loaded_reranker
+        if not query:
+            return
+        with startup_stage("warm_query"):
+            get_encoding()
+            get_relevant_context("admission requirements", live_retriever.lease.retriever, k=10, reranker=reranker)
+    except Exception as e:
+        startup["error"] = f"{type(e).__name__}: {e}"
+        print(f"❌ Warm-up failed during {startup['stage']}: {startup['error']}")
+        return
+    if INDEX_WATCH_INTERVAL > 0:
+        watcher = IndexWatcher(live_retriever)
+        watcher.start()
+    startup.update(ready=True, stage="ready",
+                   seconds_to_ready=round(time.time() - psutil.Process().create_time(), 2))
+    print(f"✅ Ready {startup['seconds_to_ready']}s after process start")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background so the server accepts connections (and health checks) immediately.
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    yield
+    if watcher:
+        watcher.stop()
+    warm_up_task.cancel()
+    retrieval_pool.shutdown(wait=False)
+
+if PRELOAD_MODELS:
+    warm_up(query=False)
+
+def get_live_retriever():
+    if live_retriever is None:
+        raise HTTPException(status_code=503, detail=f"Starting up ({startup['stage']})")
+    return live_retriever
+
+app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
 
 SYSTEM_PROMPT = {
@@ -29,12 +138,20 @@ SYSTEM_PROMPT = {
     )
 }
 
-try:
-    vectorstore = load_vectorstore()
-    print("Vector store loaded successfully.")
-except Exception:
-    print("Vector store not found. Creating a new one...")
-    vectorstore = create_and_save_vectorstore_with_crawl()
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving HTTP, whether or not warm-up has finished"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the model and stores are loaded, 503 with the current warm-up stage before that"""
+    body = dict(startup)
+    if live_retriever is not None:
+        body["versions"] = live_retriever.store_versions
+    return JSONResponse(body, status_code=200 if startup["ready"] else 503)
 
 
 @app.get("/debug-web-content")
@@ -51,8 +168,39 @@ async def debug_web_content():
     }
 
 
-def create_contextual_message(user_input: str) -> str:
-    context = get_relevant_context(user_input, vectorstore, k=10)
+@app.get("/debug-cache-stats")
+async def debug_cache_stats():
+    """Query and answer cache hit/miss counters"""
+    return {"query": query_cache.stats(), "answers": answer_cache.stats(), "coalescing": in_flight.stats()}
+
+
+@app.post("/admin/reload")
+def admin_reload(force: bool = False, x_admin_token: str = Header(default="")):
+    """Load the newest published vector store and swap it in without dropping open chats"""
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    live = get_live_retriever()
+    reloaded = live.reload(force=force)
+    return {"reloaded": reloaded, "versions": live.store_versions}
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(max_length=BATCH_SEARCH_MAX_QUERIES)
+    k: int = Field(10, gt=0, le=BATCH_SEARCH_MAX_K)
+
+
+@app.post("/search/batch")
+def search_batch(request: BatchSearchRequest):
+    """Top-k chunk IDs, scores and sources for many queries, one FAISS search per index"""
+    if not request.queries:
+        return {"results": []}
+    with get_live_retriever().acquire() as retriever:
+        results = retriever.batch_search(request.queries, k=request.k)
+    return {"results": [{"query": query, "hits": hits} for query, hits in zip(request.queries, results)]}
+
+
+def create_contextual_message(user_input: str, retriever) -> str:
+    context = get_relevant_context(user_input, retriever, k=10, reranker=reranker)
     print("\n🔍 Retrieved Context:\n", context[:500], "...\n")
     return (
         f"{context}\n\n"
@@ -61,6 +209,37 @@ def create_contextual_message(user_input: str) -> str:
         "If you don't find the answer in the information above, reply: \"I'm sorry, I couldn't find that information.\""
     )
 
+async def stream_completion(messages):
+    response = await openai.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=messages,
+        temperature=0.6,
+        stream=True,
+    )
+    async for chunk in response:
+        delta = chunk.choices[0].delta
+        if delta and getattr(delta, "content", None):
+            yield delta.content
+
+async def produce_first_turn_answer(user_input: str, retriever):
+    # Its own lease on the caller's retriever: the answer must come from the index version its key
+    # and cache entry name, and the chat that started this flight may disconnect before it finishes.
+    with get_live_retriever().acquire(retriever):
+        contextual_message = await run_retrieval(create_contextual_message, user_input, retriever)
+        answer = ""
+        async for piece in stream_completion([SYSTEM_PROMPT, {"role": "user", "content": contextual_message}]):
+            answer += piece
+            yield piece
+        await run_retrieval(answer_cache.put, retriever, user_input, answer)
+
+in_flight = SingleFlight()
+
+def first_turn_answer(user_input: str, retriever):
+    """Stream the answer to a first-turn question; identical questions asked meanwhile share one
+    retrieval and completion and receive the same token stream."""
+    key = (normalize_query(user_input), retriever.version())
+    return in_flight.stream(key, lambda: produce_first_turn_answer(user_input, retriever))
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse("home.html", {"request": request, "chat_responses": []})
@@ -68,50 +247,53 @@ async def index(request: Request):
 @app.websocket("/ws")
 async def chat_socket(websocket: WebSocket):
     await websocket.accept()
-    chat_log: List[Dict[str, Any]] = [SYSTEM_PROMPT]
-    chat_responses: List[str] = []
+    if live_retriever is None:
+        await websocket.close(code=1013, reason="Starting up, try again shortly")
+        return
+    history = ChatHistory(SYSTEM_PROMPT)
     try:
         while True:
             user_input = await websocket.receive_text()
-            contextual_message = create_contextual_message(user_input)
-            chat_log.append({"role": "user", "content": contextual_message})
-            chat_responses.append(user_input)
-            try:
-                response = openai.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=chat_log,
-                    temperature=0.6,
-                    stream=True,
-                )
-                ai_response = ""
-                for chunk in response:
-                    delta = chunk.choices[0].delta
-                    if delta and getattr(delta, "content", None):
-                        ai_response += delta.content
-                        await websocket.send_text(delta.content)
-                chat_log.append({"role": "assistant", "content": ai_response})
-                chat_responses.append(ai_response)
-            except Exception as e:
-                await websocket.send_text(f"Error: {str(e)}")
-                break
+            # The whole turn answers from one store version, even if a reload swaps it meanwhile.
+            with live_retriever.acquire() as retriever:
+                first_turn = history.total_turns == 0
+                cached = await run_retrieval(answer_cache.get, retriever, user_input) if first_turn else None
+                if cached is not None:
+                    print(f"💡 Answer cache hit for: '{user_input}'")
+                    for piece in stream_pieces(cached):
+                        await websocket.send_text(piece)
+                    history.add_turn(user_input, cached)
+                    continue
+                try:
+                    if first_turn:
+                        pieces = first_turn_answer(user_input, retriever)
+                    else:
+                        contextual_message = await run_retrieval(create_contextual_message, user_input, retriever)
+                        pieces = stream_completion(history.messages(contextual_message))
+                    ai_response = ""
+                    async for piece in pieces:
+                        ai_response += piece
+                        await websocket.send_text(piece)
+                    history.add_turn(user_input, ai_response)
+                except WebSocketDisconnect:
+                    raise
+                except Exception as e:
+                    await websocket.send_text(f"Error: {str(e)}")
+                    break
     except WebSocketDisconnect:
         print("WebSocket disconnected.")
 
 
 @app.post("/", response_class=HTMLResponse)
 async def handle_post(request: Request, user_input: str = Form(...)):
-    chat_log = [SYSTEM_PROMPT]
     chat_responses = []
-    contextual_message = create_contextual_message(user_input)
-    chat_log.append({"role": "user", "content": contextual_message})
+    with get_live_retriever().acquire() as retriever:
+        bot_response = await run_retrieval(answer_cache.get, retriever, user_input)
+        if bot_response is not None:
+            print(f"💡 Answer cache hit for: '{user_input}'")
+        else:
+            bot_response = "".join([piece async for piece in first_turn_answer(user_input, retriever)])
     chat_responses.append(user_input)
-    response = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=chat_log,
-        temperature=0.6,
-    )
-    bot_response = response.choices[0].message.content
-    chat_log.append({"role": "assistant", "content": bot_response})
     chat_responses.append(bot_response)
     return templates.TemplateResponse("home.html", {"request": request, "chat_responses": chat_responses})
 
@@ -121,6 +303,19 @@ async def image_page(request: Request):
 
 @app.post("/image", response_class=HTMLResponse)
 async def generate_image(request: Request, user_input: str = Form(...)):
-    response = openai.images.generate(prompt=user_input, n=1, size="512x512")
+    response = await openai.images.generate(prompt=user_input, n=1, size="512x512")
     image_url = response.data[0].url
-    return templates.TemplateResponse("image.html", {"request": request, "image_url": image_url})
\ No newline at end of file
+    return templates.TemplateResponse("image.html", {"request": request, "image_url": image_url})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline tasks for the chatbot server (serve with `uvicorn main:app`).")
+    parser.add_argument("--prebuild", metavar="BASE_URL", nargs="?", const=CRAWL_BASE_URL,
+                        help="crawl and build the vector store now, without serving")
+    parser.add_argument("--force", action="store_true", help="rebuild even if no crawled page changed")
+    parser.add_argument("--cold-start", action="store_true", help="run the server warm-up once and report its timings")
+    args = parser.parse_args()
+    if args.prebuild:
+        create_and_save_vectorstore_with_crawl(args.prebuild, force=args.force)
+    if args.cold_start:
+        warm_up()
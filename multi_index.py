@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from data import VECTOR_STORE_PATHS, load_vectorstore
+from faiss_index import INDEX_MMAP
+from lexical import load_lexical_index
+from query_cache import index_version
+from store_versions import current_version, resolve_store_path
+from retrieval import RRF_K, embed_query, embed_queries, search_ids, batch_search_ids, fetch_document
+
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+
+
+class IndexShard:
+    def __init__(self, path, store, lexical_index=None, version=None):
+        self.name = os.path.normpath(path)
+        self.path = path
+        self.store = store
+        self.lexical_index = lexical_index
+        self.version = version
+
+    @classmethod
+    def load(cls, path):
+        version = current_version(path)
+        resolved = resolve_store_path(path)
+        return cls(path, load_vectorstore(resolved, mmap_index=INDEX_MMAP), load_lexical_index(resolved), version)
+
+    def close(self):
+        if hasattr(self.store.docstore, "close"):
+            self.store.docstore.close()
+
+    def search(self, query, k):
+        """[(shard name, chunk ID)], best first."""
+        return [(self.name, doc_id) for doc_id, _ in search_ids(self.store, query, k, self.lexical_index)]
+
+    def batch_search(self, queries, k):
+        return [[(self.name, doc_id) for doc_id, _ in hits]
+                for hits in batch_search_ids(self.store, queries, k, self.lexical_index)]
+
+
+class MultiIndexRetriever:
+    """Searches several saved stores (e.g. one per source type) in parallel and merges their hits.
+
+    Each shard is built, saved and reloaded on its own; the shards must share an embedding model.
+    """
+
+    def __init__(self, shards, workers=SEARCH_WORKERS):
+        self.shards = shards
+        self.by_name = {shard.name: shard for shard in shards}
+        self.pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(shards))), thread_name_prefix="search")
+
+    @classmethod
+    def load(cls, paths=VECTOR_STORE_PATHS, workers=SEARCH_WORKERS):
+        return cls([IndexShard.load(path) for path in paths], workers)
+
+    @property
+    def store_versions(self):
+        """Published version of each shard (None for an unversioned store directory)."""
+        return {shard.name: shard.version for shard in self.shards}
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for shard in self.shards:
+            shard.close()
+
+    def version(self):
+        return tuple((index_version(shard.store), index_version(shard.lexical_index)) for shard in self.shards)
+
+    def embed_query(self, query):
+        return embed_query(self.shards[0].store, query)
+
+    def fan_out(self, method, *args):
+        if len(self.shards) == 1:
+            return [getattr(self.shards[0], method)(*args)]
+        return list(self.pool.map(lambda shard: getattr(shard, method)(*args), self.shards))
+
+    def merge(self, shard_hits, k):
+        """Fuse the shards' rankings with RRF -> [(name, chunk ID, relevance in (0, 1])].
+
+        Hybrid and vector-only shards score on unrelated scales, so only ranks are compared;
+        equal ranks keep the configured shard order.
+        """
+        fused = [(name, doc_id, (RRF_K + 1) / (RRF_K + rank))
+                 for hits in shard_hits for rank, (name, doc_id) in enumerate(hits, start=1)]
+        return sorted(fused, key=lambda hit: hit[2], reverse=True)[:k]
+
+    def search(self, query, k=10):
+        """[(Document, -relevance)] for the top k chunks across all shards, lower score first."""
+        # Embed once up front so the shards don't all miss the query cache at the same time.
+        self.embed_query(query)
+        return [(fetch_document(self.by_name[name].store, doc_id), -relevance)
+                for name, doc_id, relevance in self.merge(self.fan_out("search", query, k), k)]
+
+    def batch_search(self, queries, k=10):
+        """[[{"id", "score", "source", "index"}]] per query, best first."""
+        if not queries:
+            return []
+        embed_queries(self.shards[0].store, queries)
+        per_shard = self.fan_out("batch_search", queries, k)
+        results = []
+        for shard_hits in zip(*per_shard):
+            results.append([
+                {"id": doc_id, "score": relevance, "index": name,
+                 "source": fetch_document(self.by_name[name].store, doc_id).metadata.get("source")}
+                for name, doc_id, relevance in self.merge(shard_hits, k)
+            ])
+        return results
@@ -0,0 +1,178 @@
+import os
+import queue
+import asyncio
+import threading
+from collections import defaultdict
+from langchain.docstore.document import Document
+from langchain_community.vectorstores import FAISS
+
+from crawl import run_crawler
+from data import (
+    PDF_FILES,
+    EMBED_MODEL,
+    VECTOR_STORE_PATH,
+    get_embeddings,
+    load_pdfs,
+    make_text_splitter,
+    assign_chunk_ids,
+    source_key,
+    publish_vectorstore,
+    sources_fingerprint,
+)
+from dedup import NearDuplicateFilter, load_dedup_state, strip_lines
+from store_versions import resolve_store_path
+from embed_cache import EMBED_BATCH_SIZE, EmbeddingCache, CachedEmbeddings
+from faiss_index import INDEX_TYPE, reindex
+from buildstats import BuildReport, dir_size
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+
+_DONE = object()
+
+
+class Stage(threading.Thread):
+    def __init__(self, name, target, *args):
+        super().__init__(name=name, daemon=True)
+        self.target = target
+        self.args = args
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.target(*self.args)
+        except BaseException as e:
+            self.error = e
+
+
+def drain(q):
+    while q.get() is not _DONE:
+        pass
+
+
+def chunk_stage(pages, chunks, boilerplate=frozenset()):
+    splitter = make_text_splitter()
+    dup_filter = NearDuplicateFilter()
+    id_counters = defaultdict(int)
+    counts = {"pages": 0, "duplicates": 0, "chunks": 0}
+    try:
+        while (doc := pages.get()) is not _DONE:
+            if "page" not in doc.metadata:  # a crawled page; PDFs keep every line, as in the batch build
+                doc = Document(page_content=strip_lines(doc.page_content, boilerplate), metadata=doc.metadata)
+                if not doc.page_content:
+                    continue
+            if dup_filter.is_duplicate(doc.page_content, source_key(doc.metadata)):
+                counts["duplicates"] += 1
+                continue
+            counts["pages"] += 1
+            doc_chunks = splitter.split_documents([doc])
+            for chunk, chunk_id in zip(doc_chunks, assign_chunk_ids(doc_chunks, id_counters)):
+                chunks.put((chunk, chunk_id))
+                counts["chunks"] += 1
+    except BaseException:
+        # Keep consuming so the crawler and PDF feeder never block on a dead stage.
+        drain(pages)
+        raise
+    finally:
+        chunks.put(_DONE)
+    return counts, dup_filter.hashes
+
+
+def embed_stage(chunks, embeddings, batch_size):
+    cached = CachedEmbeddings(embeddings, EmbeddingCache(EMBED_MODEL), batch_size=batch_size)
+    store = None
+    batch = []
+
+    def flush():
+        nonlocal store
+        texts = [chunk.page_content for chunk, _ in batch]
+        metadatas = [chunk.metadata for chunk, _ in batch]
+        ids = [chunk_id for _, chunk_id in batch]
+        text_embeddings = list(zip(texts, cached.embed_documents(texts)))
+        if store is None:
+            store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+        else:
+            store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        batch.clear()
+
+    try:
+        while (item := chunks.get()) is not _DONE:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush()
+    except BaseException:
+        drain(chunks)
+        raise
+    if batch:
+        flush()
+    cached.cache.save(prune=True)
+    print(f"🧠 Embedded {cached.misses} new chunks, reused {cached.hits} cached embeddings.")
+    return store
+
+
+def feed_pdfs(pdf_files, pages):
+    for doc in load_pdfs(pdf_files):
+        pages.put(doc)
+
+
+def build_vectorstore_streaming(base_url, pdf_files=PDF_FILES, path=VECTOR_STORE_PATH,
+                                queue_size=PIPELINE_QUEUE_SIZE, batch_size=EMBED_BATCH_SIZE,
+                                index_type=INDEX_TYPE, **crawl_kwargs):
+    """Crawl, chunk, embed and index concurrently, then publish the store under `path`.
+
+    Pages go straight from the crawler to the chunker; only the crawl manifest is written,
+    not a .txt file per page (pass write_files=True to keep them for index_update.py).
+    Pages can't be compared with each other before they are chunked, so boilerplate is
+    stripped using the lines learned by the last full build of `path`, if there is one.
+    """
+    crawl_kwargs.setdefault("write_files", False)
+    print("🚰 Starting streaming vector store build...")
+    boilerplate, _ = load_dedup_state(resolve_store_path(path))
+    pages = queue.Queue(maxsize=queue_size)
+    chunks = queue.Queue(maxsize=queue_size * 4)
+    embeddings = get_embeddings()
+    chunker = Stage("chunker", chunk_stage, pages, chunks, boilerplate)
+    embedder = Stage("embedder", embed_stage, chunks, embeddings, batch_size)
+    pdf_feeder = Stage("pdf-feeder", feed_pdfs, pdf_files, pages)
+    for stage in (chunker, embedder, pdf_feeder):
+        stage.start()
+
+    async def on_page(url, filename, text):
+        # Blocks (off the event loop) while the chunker is behind, which throttles the crawl.
+        await asyncio.to_thread(pages.put, Document(page_content=text, metadata={"source": filename}))
+
+    with BuildReport("streaming_build") as build:
+        with build.stage("crawl_chunk_embed") as stats:
+            try:
+                if base_url:
+                    run_crawler(base_url, on_page=on_page, **crawl_kwargs)
+                pdf_feeder.join()
+            finally:
+                pages.put(_DONE)
+                chunker.join()
+                embedder.join()
+            for stage in (pdf_feeder, chunker, embedder):
+                if stage.error:
+                    raise stage.error
+            counts, simhashes = chunker.result
+            stats.update(items=counts["chunks"])
+        print(f"🧩 Streamed {counts['pages']} documents into {counts['chunks']} chunks "
+              f"({counts['duplicates']} near-duplicates skipped).")
+        sources = sources_fingerprint(pdf_files, crawl_kwargs.get("output_dir", "crawl")) if base_url else None
+        store = embedder.result
+        if store is None:
+            print("⚠️ No documents were indexed.")
+            return None
+        # Compressed and ANN indexes need training data, so the streamed flat index is converted at the end.
+        with build.stage("reindex") as stats:
+            reindex(store, index_type)
+            stats.update(items=store.index.ntotal)
+        with build.stage("save_vectorstore") as stats:
+            version_path = publish_vectorstore(store, path, sources=sources, boilerplate=boilerplate,
+                                               simhashes=simhashes)
+            stats.update(items=store.index.ntotal, bytes=dir_size(version_path))
+    return store
+
+if __name__ == "__main__":
+    base_url = input("Enter base URL to crawl (e.g. 'https://www.ajman.ac.ae/'): ").strip()
+    build_vectorstore_streaming(base_url)
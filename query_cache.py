@@ -0,0 +1,81 @@
+import os
+import re
+import time
+import itertools
+import threading
+from collections import OrderedDict
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "900"))  # seconds
+
+WHITESPACE_RE = re.compile(r"\s+")
+_index_tokens = itertools.count(1)
+
+def normalize_query(text):
+    return WHITESPACE_RE.sub(" ", text).strip().strip("?!.").strip().lower()
+
+def index_version(index):
+    """Cache identity of a loaded store or lexical index: a token stamped on the object plus its vector count.
+
+    A rebuilt, reloaded or updated index gets a new version, so entries cached for the old one stop matching.
+    """
+    if index is None:
+        return None
+    token = getattr(index, "cache_token", None)
+    if token is None:
+        token = index.cache_token = next(_index_tokens)
+    return token, getattr(getattr(index, "index", None), "ntotal", None)
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None}
+
+
+class QueryCache:
+    """Query embeddings, keyed by model, and top-k chunk IDs, keyed by the versions of the searched indexes."""
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.embeddings = TTLCache(maxsize, ttl)
+        self.results = TTLCache(maxsize, ttl)
+
+    def stats(self):
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats()}
+
+query_cache = QueryCache()
@@ -0,0 +1,46 @@
+import os
+import time
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "20"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "4"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+
+
+class CrossEncoderReranker:
+    """Second retrieval stage: rescore (query, chunk) pairs with a small cross-encoder on the CPU."""
+
+    def __init__(self, model_name=RERANK_MODEL, top_n=RERANK_TOP_N, fetch_k=RERANK_FETCH_K,
+                 batch_size=RERANK_BATCH_SIZE):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.model_name = model_name
+        self.top_n = top_n
+        self.fetch_k = fetch_k
+        self.batch_size = batch_size
+
+    def rerank(self, query, scored_docs):
+        """[(Document, first-stage score)] -> top_n [(Document, -relevance)] and timing stats.
+
+        Relevance is negated so that, like L2 distances, lower sorts first in assemble_context.
+        """
+        started = time.perf_counter()
+        scores = self.model.predict([(query, doc.page_content) for doc, _ in scored_docs],
+                                    batch_size=self.batch_size, show_progress_bar=False)
+        ranked = sorted(zip((doc for doc, _ in scored_docs), scores), key=lambda item: item[1], reverse=True)
+        results = [(doc, -float(score)) for doc, score in ranked[:self.top_n]]
+        stats = {"candidates": len(scored_docs), "kept": len(results),
+                 "seconds": time.perf_counter() - started}
+        return results, stats
+
+def load_reranker():
+    if not RERANK_ENABLED:
+        return None
+    try:
+        reranker = CrossEncoderReranker()
+    except Exception as e:
+        print(f"⚠️ Reranker '{RERANK_MODEL}' unavailable ({e}); using first-stage ranking only.")
+        return None
+    print(f"🎯 Reranker loaded ({RERANK_MODEL}, {RERANK_FETCH_K} → {RERANK_TOP_N} chunks)")
+    return reranker
@@ -0,0 +1,106 @@
+import os
+import numpy as np
+from langchain.docstore.document import Document
+
+from query_cache import query_cache, normalize_query, index_version
+from embed_cache import EMBED_BATCH_SIZE
+
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_FETCH_FACTOR = int(os.getenv("HYBRID_FETCH_FACTOR", "2"))
+
+def fetch_document(store, doc_id):
+    doc = store.docstore.search(doc_id)
+    if not isinstance(doc, Document):
+        raise ValueError(f"Could not find {doc_id} in the docstore, got {doc}")
+    doc.id = doc_id
+    return doc
+
+def embedding_key(store, text):
+    return getattr(store.embeddings, "model_name", type(store.embeddings).__name__), text
+
+def embed_query(store, query):
+    key = embedding_key(store, normalize_query(query))
+    vector = query_cache.embeddings.get(key)
+    if vector is None:
+        vector = np.asarray(store.embeddings.embed_query(key[1]), dtype=np.float32)
+        query_cache.embeddings.put(key, vector)
+    return vector
+
+def embed_queries(store, queries, batch_size=EMBED_BATCH_SIZE):
+    """Stack query embeddings into one matrix, embedding cache misses in batches.
+
+    Uses embed_documents for the misses, which for MiniLM encodes exactly like embed_query.
+    """
+    keys = [embedding_key(store, normalize_query(query)) for query in queries]
+    vectors = {key: query_cache.embeddings.get(key) for key in dict.fromkeys(keys)}
+    missing = [key for key, vector in vectors.items() if vector is None]
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        for key, vector in zip(batch, store.embeddings.embed_documents([text for _, text in batch])):
+            vectors[key] = np.asarray(vector, dtype=np.float32)
+            query_cache.embeddings.put(key, vectors[key])
+    return np.stack([vectors[key] for key in keys])
+
+def search_matrix(store, vectors, k=10):
+    """One FAISS search for every row of `vectors` -> [[(chunk ID, L2 distance)]] per row."""
+    distances, positions = store.index.search(np.ascontiguousarray(vectors, dtype=np.float32), k)
+    return [
+        [(store.index_to_docstore_id[position], float(distance))
+         for distance, position in zip(row_distances, row_positions) if position != -1]
+        for row_distances, row_positions in zip(distances, positions)
+    ]
+
+def vector_search_ids(store, query, k=10):
+    """[(chunk ID, L2 distance)] for the k nearest chunks."""
+    return search_matrix(store, embed_query(store, query)[None, :], k)[0]
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def fuse_hits(vector_hits, lexical_hits, k):
+    # Scores are negated so that, as with L2 distances, lower means more relevant.
+    fused = reciprocal_rank_fusion([[doc_id for doc_id, _ in vector_hits], [doc_id for doc_id, _ in lexical_hits]])
+    return [(doc_id, -score) for doc_id, score in fused[:k]]
+
+def hybrid_search_ids(store, lexical_index, query, k=10, fetch_k=None):
+    """Fuse vector and BM25 rankings with RRF."""
+    fetch_k = fetch_k or k * HYBRID_FETCH_FACTOR
+    return fuse_hits(vector_search_ids(store, query, fetch_k), lexical_index.search(query, fetch_k), k)
+
+def results_key(store, lexical_index, query, k):
+    return index_version(store), index_version(lexical_index), normalize_query(query), k
+
+def search_ids(store, query, k=10, lexical_index=None):
+    """[(chunk ID, score)] for the top k chunks, lower score first; repeated queries are served from query_cache."""
+    key = results_key(store, lexical_index, query, k)
+    hits = query_cache.results.get(key)
+    if hits is None:
+        if lexical_index is not None:
+            hits = hybrid_search_ids(store, lexical_index, query, k)
+        else:
+            hits = vector_search_ids(store, query, k)
+        query_cache.results.put(key, hits)
+    return hits
+
+def search(store, query, k=10, lexical_index=None):
+    """[(Document, score)] for the top k chunks, lower score first."""
+    return [(fetch_document(store, doc_id), score) for doc_id, score in search_ids(store, query, k, lexical_index)]
+
+def batch_search_ids(store, queries, k=10, lexical_index=None):
+    """search() for many queries at once: cached queries are reused and the rest share one FAISS search."""
+    keys = [results_key(store, lexical_index, query, k) for query in queries]
+    results = [query_cache.results.get(key) for key in keys]
+    pending = [i for i, hits in enumerate(results) if hits is None]
+    if pending:
+        fetch_k = k * HYBRID_FETCH_FACTOR if lexical_index is not None else k
+        vectors = embed_queries(store, [queries[i] for i in pending])
+        for i, hits in zip(pending, search_matrix(store, vectors, fetch_k)):
+            if lexical_index is not None:
+                hits = fuse_hits(hits, lexical_index.search(queries[i], fetch_k), k)
+            results[i] = hits
+            query_cache.results.put(keys[i], hits)
+    return results
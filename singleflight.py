@@ -0,0 +1,78 @@
+import asyncio
+
+
+class Flight:
+    """One in-progress answer: the pieces produced so far, replayed to late subscribers, then live."""
+
+    def __init__(self):
+        self.pieces = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Condition()
+
+    async def publish(self, piece):
+        async with self.changed:
+            self.pieces.append(piece)
+            self.changed.notify_all()
+
+    async def finish(self, error=None):
+        async with self.changed:
+            self.done = True
+            self.error = error
+            self.changed.notify_all()
+
+    async def stream(self):
+        sent = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.pieces) > sent or self.done)
+                pieces, done, error = self.pieces[sent:], self.done, self.error
+            for piece in pieces:
+                yield piece
+            sent += len(pieces)
+            if done and sent == len(self.pieces):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """Coalesces identical concurrent requests: the first starts the work, later ones subscribe to it.
+
+    The work runs in its own task, so a subscriber that goes away (even the first) doesn't cancel it
+    for the others. Meant for use from a single event loop.
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def stream(self, key, produce):
+        """Async iterator over the pieces of `produce()` (an async iterator of str), shared per key."""
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = Flight()
+            self.started += 1
+            flight.task = asyncio.create_task(self.run(key, flight, produce()))
+        else:
+            self.coalesced += 1
+        return flight.stream()
+
+    async def run(self, key, flight, pieces):
+        try:
+            async for piece in pieces:
+                await flight.publish(piece)
+        except asyncio.CancelledError:
+            # Cancelled (e.g. at shutdown): release the subscribers with an ordinary error, then propagate.
+            await flight.finish(RuntimeError("The answer was cancelled before it finished."))
+            raise
+        except Exception as e:
+            await flight.finish(e)
+        else:
+            await flight.finish()
+        finally:
+            self.flights.pop(key, None)
+
+    def stats(self):
+        return {"in_flight": len(self.flights), "started": self.started, "coalesced": self.coalesced}
@@ -0,0 +1,80 @@
+import os
+import re
+import json
+import shutil
+from datetime import datetime, timezone
+
+CURRENT_VERSION_FILE = "CURRENT"
+STORE_MANIFEST_FILE = "manifest.json"
+KEEP_STORE_VERSIONS = int(os.getenv("KEEP_STORE_VERSIONS", "3"))
+VERSION_NAME_RE = re.compile(r"^(.*?)(?:-(\d+))?$")
+
+# A versioned store root looks like:
+#   vectorstore/CURRENT                  -> "v20250723T101500Z"
+#   vectorstore/v20250723T101500Z/       index.faiss, docstore.*, bm25.*, sources.json, manifest.json
+# A root without CURRENT is a plain, unversioned store directory and is used as-is.
+
+def current_version(root):
+    try:
+        with open(os.path.join(root, CURRENT_VERSION_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def resolve_store_path(root):
+    version = current_version(root)
+    return os.path.join(root, version) if version else root
+
+def new_version_dir(root):
+    version = "v" + datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    name, n = version, 1
+    while os.path.exists(os.path.join(root, name)):
+        n += 1
+        name = f"{version}-{n}"
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    return name, path
+
+def version_sort_key(name):
+    # "v20250723T101500Z-10" comes after "-2": compare the counter suffix as a number.
+    stamp, n = VERSION_NAME_RE.match(name).groups()
+    return stamp, int(n or 1)
+
+def write_manifest(path, version, **details):
+    manifest = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **details,
+        "files": {name: os.path.getsize(os.path.join(path, name)) for name in sorted(os.listdir(path))},
+    }
+    with open(os.path.join(path, STORE_MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+def read_manifest(path):
+    manifest_path = os.path.join(path, STORE_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def set_current_version(root, version):
+    # Readers only ever see the old or the new pointer, never a half-written one.
+    tmp = os.path.join(root, CURRENT_VERSION_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, CURRENT_VERSION_FILE))
+
+def prune_versions(root, keep=KEEP_STORE_VERSIONS):
+    current = current_version(root)
+    versions = sorted((name for name in os.listdir(root)
+                       if os.path.isfile(os.path.join(root, name, STORE_MANIFEST_FILE))), key=version_sort_key)
+    for name in versions[:-keep] if keep > 0 else versions:
+        if name == current:
+            continue
+        try:
+            shutil.rmtree(os.path.join(root, name))
+            print(f"🧹 Removed old store version '{name}'")
+        except OSError as e:
+            # Windows refuses while a server still has the old files mapped; retried on the next publish.
+            print(f"⚠️ Could not remove store version '{name}': {e}")
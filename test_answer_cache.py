@@ -0,0 +1,49 @@
+import numpy as np
+
+from answer_cache import SemanticAnswerCache, stream_pieces
+
+QUESTIONS = ["fees", "housing", "parking", "library"]
+
+
+class FakeRetriever:
+    """Embeds each known question as its own axis; `current` is the index version."""
+    current = 1
+
+    def embed_query(self, question):
+        return np.eye(len(QUESTIONS), dtype=np.float32)[QUESTIONS.index(question)]
+
+    def version(self):
+        return self.current
+
+
+def test_answers_only_match_the_index_version_they_came_from():
+    cache, retriever = SemanticAnswerCache(maxsize=4, ttl=60), FakeRetriever()
+    cache.put(retriever, "fees", "old fees")
+    assert cache.get(retriever, "fees") == "old fees"
+    assert cache.get(retriever, "housing") is None
+    retriever.current = 2
+    assert cache.get(retriever, "fees") is None
+    cache.put(retriever, "fees", "new fees")
+    assert cache.get(retriever, "fees") == "new fees"
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache, retriever = SemanticAnswerCache(maxsize=2, ttl=60), FakeRetriever()
+    cache.put(retriever, "fees", "a")
+    cache.put(retriever, "housing", "b")
+    assert cache.get(retriever, "fees") == "a"
+    cache.put(retriever, "parking", "c")
+    assert cache.get(retriever, "housing") is None
+    assert cache.get(retriever, "fees") == "a" and cache.get(retriever, "parking") == "c"
+
+
+def test_expired_answers_are_not_served():
+    cache, retriever = SemanticAnswerCache(maxsize=2, ttl=0), FakeRetriever()
+    cache.put(retriever, "fees", "a")
+    assert cache.get(retriever, "fees") is None and cache.stats()["size"] == 0
+
+
+def test_stream_pieces_rebuild_the_answer():
+    answer = "Fees are  listed\nper credit hour. "
+    assert "".join(stream_pieces(answer)) == answer
@@ -0,0 +1,52 @@
+import tiktoken
+from langchain_core.documents import Document
+
+import context
+from context import assemble_context, merge_overlap
+
+OVERLAP = "The admissions office is open Sunday to Thursday from 8am to 4pm."
+
+
+def chunk(source, position, text):
+    return Document(id=f"{source}::{position}", page_content=text, metadata={"source": source})
+
+
+def test_merge_overlap_writes_the_shared_span_once():
+    assert merge_overlap("Intro. " + OVERLAP, OVERLAP + " Call us.") == "Intro. " + OVERLAP + " Call us."
+    assert merge_overlap("Intro.", "Unrelated text that is long enough to probe.") is None
+
+
+def test_overlapping_chunks_of_one_source_become_one_block():
+    hits = [(chunk("a.txt", 1, OVERLAP + " Call us on 123."), 0.2), (chunk("a.txt", 0, "Intro. " + OVERLAP), 0.4),
+            (chunk("b.txt", 0, "Another source entirely."), 0.3)]
+    context, stats = assemble_context(hits, token_budget=1000)
+    assert context == "Intro. " + OVERLAP + " Call us on 123.\n\nAnother source entirely."
+    assert context.count(OVERLAP) == 1
+    assert stats["chunks"] == 3 and stats["blocks"] == 2 and stats["tokens_saved"] > 0
+
+
+def test_chunks_of_different_sources_are_not_merged():
+    hits = [(chunk("a.txt", 0, "Intro.\n" + OVERLAP), 0.1), (chunk("b.txt", 0, OVERLAP + "\nElsewhere."), 0.2)]
+    context, stats = assemble_context(hits, token_budget=1000)
+    # A line repeated across sources is written once; each source keeps its own block.
+    assert context == "Intro.\n" + OVERLAP + "\n\nElsewhere."
+    assert stats["blocks"] == 2
+
+
+def test_a_failed_tokenizer_lookup_is_retried(monkeypatch):
+    lookups = []
+
+    def encoding_for_model(model):
+        lookups.append(model)
+        if len(lookups) == 1:
+            raise OSError("offline")
+        return "encoding"
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", encoding_for_model)
+    monkeypatch.setattr(context, "loaded_encoding", None)
+    monkeypatch.setattr(context, "encoding_failed_at", None)
+    assert context.get_encoding() is None and context.get_encoding() is None
+    assert len(lookups) == 1
+    monkeypatch.setattr(context, "ENCODING_RETRY_SECONDS", 0)
+    assert context.get_encoding() == "encoding" and context.get_encoding() == "encoding"
+    assert len(lookups) == 2
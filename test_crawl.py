@@ -0,0 +1,177 @@
+import os
+import time
+import asyncio
+import threading
+
+import pytest
+
+from bench import FakeSiteHandler, start_fake_site
+from crawl import TokenBucket, load_manifest, parse_sitemap, run_crawler, safe_filename_from_url
+
+
+class SmallSite(FakeSiteHandler):
+    """Records the most requests it has had in flight at once in `max_in_flight`."""
+    pages = 60
+    latency = 0.02
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            super().do_GET()
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+class QuerySite(FakeSiteHandler):
+    """/ links /news and, while `link_page_2` is set, /news?page=2."""
+    link_page_2 = True
+
+    def do_GET(self):
+        if self.path == "/":
+            body = '<a href="/news">News</a>' + ('<a href="/news?page=2">More</a>' if self.link_page_2 else "")
+        elif self.path == "/news":
+            body = "<p>Latest news</p>"
+        elif self.path == "/news?page=2":
+            body = "<p>Older news</p>"
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_text(body, "text/html")
+
+
+@pytest.fixture
+def site(request):
+    server = start_fake_site(getattr(request, "param", SmallSite))
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+
+
+def crawled_files(output_dir):
+    return sorted(name for name in os.listdir(output_dir) if name.endswith(".txt"))
+
+
+def crawl_in_flight(site, output_dir, concurrency):
+    SmallSite.max_in_flight = 0
+    report = run_crawler(site, depth=3, output_dir=output_dir, concurrency=concurrency, host_rate=0)
+    return report, SmallSite.max_in_flight
+
+
+def test_concurrent_crawl_matches_sequential_and_overlaps_requests(site, tmp_path):
+    sequential, sequential_in_flight = crawl_in_flight(site, str(tmp_path / "c1"), 1)
+    concurrent, concurrent_in_flight = crawl_in_flight(site, str(tmp_path / "c16"), 16)
+    assert sequential["pages"] == concurrent["pages"] == SmallSite.pages
+    assert crawled_files(tmp_path / "c1") == crawled_files(tmp_path / "c16")
+    assert sequential_in_flight == 1
+    # Page 0 links 8 children, so at least that many fetches are open together.
+    assert concurrent_in_flight >= SmallSite.fanout
+
+
+def test_host_rate_limit_is_honoured(site, tmp_path):
+    rate = 40
+    report = run_crawler(site, depth=3, output_dir=str(tmp_path), concurrency=16, host_rate=rate, host_burst=1)
+    # robots.txt and the sitemap go through the same bucket, so this is a lower bound.
+    assert report["seconds"] >= (report["pages"] - 1) / rate
+
+
+def test_token_bucket_spaces_requests_after_the_burst():
+    async def take(bucket, n):
+        started = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(take(TokenBucket(rate=20, burst=2), 2)) < 0.05
+    assert asyncio.run(take(TokenBucket(rate=20, burst=2), 6)) >= 4 / 20 * 0.9
+    assert asyncio.run(take(TokenBucket(rate=0, burst=1), 100)) < 0.05
+
+
+def test_parse_sitemap():
+    urls, sitemaps = parse_sitemap(
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        "<url><loc> https://example.com/a </loc><priority>0.8</priority><lastmod>2025-01-01</lastmod></url>"
+        "<url><loc>https://example.com/b</loc><priority>high</priority></url>"
+        "<url><priority>1.0</priority></url>"
+        "</urlset>"
+    )
+    assert urls == [("https://example.com/a", 0.8, "2025-01-01"), ("https://example.com/b", None, None)]
+    assert sitemaps == []
+    urls, sitemaps = parse_sitemap(
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        "<sitemap><loc>https://example.com/pages.xml</loc></sitemap>"
+        "</sitemapindex>"
+    )
+    assert urls == [] and sitemaps == ["https://example.com/pages.xml"]
+
+
+def test_recrawl_reports_unchanged_pages(site, tmp_path):
+    first = run_crawler(site, depth=3, output_dir=str(tmp_path), host_rate=0)
+    again = run_crawler(site, depth=3, output_dir=str(tmp_path), host_rate=0)
+    assert len(first["changes"]["added"]) == first["pages"]
+    assert len(again["changes"]["unchanged"]) == again["pages"]
+    assert not again["changes"]["added"] and not again["changes"]["changed"] and not again["changes"]["removed"]
+
+
+def test_recrawl_without_files_compares_content_hashes(site, tmp_path):
+    first = run_crawler(site, depth=3, output_dir=str(tmp_path), host_rate=0, write_files=False)
+    again = run_crawler(site, depth=3, output_dir=str(tmp_path), host_rate=0, write_files=False)
+    assert crawled_files(tmp_path) == []
+    assert all("file" not in entry for entry in load_manifest(str(tmp_path)).values())
+    assert len(again["changes"]["unchanged"]) == again["pages"] == first["pages"]
+
+
+class ShrinkingSite(SmallSite):
+    """SmallSite whose pages in `missing` answer 404."""
+    missing = set()
+
+    def do_GET(self):
+        if self.path in self.missing:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+@pytest.mark.parametrize("site", [ShrinkingSite], indirect=True)
+def test_recrawl_removes_pages_that_are_gone(site, tmp_path):
+    ShrinkingSite.missing = set()
+    run_crawler(site, depth=3, output_dir=str(tmp_path), host_rate=0)
+    gone = safe_filename_from_url(site + "page/30")  # a leaf: nothing else drops out with it
+    assert gone in crawled_files(tmp_path)
+    ShrinkingSite.missing = {"/page/30"}
+    try:
+        again = run_crawler(site, depth=3, output_dir=str(tmp_path), host_rate=0)
+    finally:
+        ShrinkingSite.missing = set()
+    assert again["changes"]["removed"] == [gone]
+    assert gone not in again["changes"]["unchanged"]
+    assert gone not in crawled_files(tmp_path)
+
+
+def test_query_string_pages_get_their_own_files():
+    assert safe_filename_from_url("https://example.com/news") != safe_filename_from_url("https://example.com/news?page=2")
+
+
+@pytest.mark.parametrize("site", [QuerySite], indirect=True)
+def test_dropped_query_page_does_not_remove_its_sibling(site, tmp_path):
+    QuerySite.link_page_2 = True
+    first = run_crawler(site, depth=3, output_dir=str(tmp_path), host_rate=0, use_sitemaps=False)
+    assert len(first["changes"]["added"]) == 3 and len(crawled_files(tmp_path)) == 3
+    QuerySite.link_page_2 = False
+    try:
+        again = run_crawler(site, depth=3, output_dir=str(tmp_path), host_rate=0, use_sitemaps=False)
+    finally:
+        QuerySite.link_page_2 = True
+    news = safe_filename_from_url(site + "news")
+    assert again["changes"]["removed"] == [safe_filename_from_url(site + "news?page=2")]
+    assert news in again["changes"]["unchanged"]
+    assert news in crawled_files(tmp_path)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+docstore = pytest.importorskip("docstore")
+from langchain.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from docstore import MmapDocstore, load_mmap_vectorstore, save_mmap_vectorstore
+from faiss_index import INDEX_TYPES, build_index, delete_ids
+
+COUNT = 200
+DIM = 16
+
+
+def make_store(path, index_type="flat"):
+    vectors = np.random.default_rng(0).standard_normal((COUNT, DIM)).astype(np.float32)
+    ids = [f"doc::{i}" for i in range(COUNT)]
+    docs = InMemoryDocstore({doc_id: Document(id=doc_id, page_content=f"text {i}", metadata={"row": i})
+                             for i, doc_id in enumerate(ids)})
+    save_mmap_vectorstore(FAISS(None, build_index(vectors, index_type), docs, dict(enumerate(ids))), str(path))
+    return load_mmap_vectorstore(str(path), None), vectors
+
+
+def test_overlay_add_and_delete(tmp_path):
+    make_store(tmp_path)
+    store = MmapDocstore(str(tmp_path))
+    assert store.search("doc::3").page_content == "text 3"
+    store.delete(["doc::3"])
+    assert store.search("doc::3") == "ID doc::3 not found."
+    with pytest.raises(ValueError):
+        store.delete(["doc::3"])
+    store.add({"doc::3": Document(id="doc::3", page_content="edited", metadata={})})
+    assert store.search("doc::3").page_content == "edited"
+    with pytest.raises(ValueError):
+        store.add({"doc::4": Document(page_content="clash")})
+    store.add({"new": Document(id="new", page_content="added", metadata={})})
+    store.delete(["new"])
+    assert store.search("new") == "ID new not found."
+
+
+def test_saving_an_edited_store_folds_the_overlay_into_the_files(tmp_path):
+    store, _ = make_store(tmp_path)
+    store.docstore.delete(["doc::3"])
+    store.docstore.add({"doc::3": Document(id="doc::3", page_content="edited", metadata={})})
+    save_mmap_vectorstore(store, str(tmp_path))
+    reopened = MmapDocstore(str(tmp_path))
+    assert reopened.search("doc::3").page_content == "edited"
+    assert reopened.search("doc::4").page_content == "text 4"
+    assert not reopened.added and not reopened.deleted
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_delete_ids_keeps_positions_and_documents_in_step(tmp_path, index_type):
+    store, vectors = make_store(tmp_path, index_type)
+    removed = {f"doc::{i}" for i in range(0, COUNT, 4)}
+    delete_ids(store, removed)
+    kept = [i for i in range(COUNT) if i % 4]
+    assert store.index.ntotal == len(kept)
+    assert store.index_to_docstore_id == {pos: f"doc::{i}" for pos, i in enumerate(kept)}
+    for i in (1, 2, 3, 101, 199):
+        hits = store.similarity_search_by_vector(vectors[i].tolist(), k=5)
+        assert hits[0].metadata["row"] == i or index_type == "ivf-pq" and i in [h.metadata["row"] for h in hits]
+    for i in (0, 100, 196):
+        hits = store.similarity_search_by_vector(vectors[i].tolist(), k=5)
+        assert f"doc::{i}" not in [h.id for h in hits]
+        assert store.docstore.search(f"doc::{i}") == f"ID doc::{i} not found."
@@ -0,0 +1,21 @@
+from history import ChatHistory
+
+SYSTEM_PROMPT = {"role": "system", "content": "You are a helpful assistant."}
+
+
+def test_old_turns_are_dropped_oldest_first():
+    history = ChatHistory(SYSTEM_PROMPT, token_window=40)
+    for i in range(10):
+        history.add_turn(f"question {i}", f"answer {i} " * 3)
+    questions = [m["content"] for m in history.messages("next")[1:-1:2]]
+    assert questions[-1] == "question 9" and "question 0" not in questions
+    assert history.tokens <= 40 and history.total_turns == 10
+
+
+def test_newest_turn_is_kept_even_when_it_exceeds_the_window():
+    history = ChatHistory(SYSTEM_PROMPT, token_window=20)
+    history.add_turn("first question", "short answer")
+    history.add_turn("what are the fees?", "word " * 100)
+    messages = history.messages("and for graduate programs?")
+    assert [m["content"] for m in messages[1:3]] == ["what are the fees?", "word " * 100]
+    assert len(history.turns) == 1
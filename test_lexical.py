@@ -0,0 +1,28 @@
+from lexical import BM25Index, tokenize
+
+DOCS = [
+    ("fees", "Tuition fees for undergraduate programs are charged per credit hour."),
+    ("cs101", "CS 101 Introduction to Programming is a first year course."),
+    ("housing", "Student housing is available for female and male students."),
+    ("scholarship", "Scholarships cover a share of tuition fees for high achievers. Fees fees fees."),
+]
+
+
+def test_course_codes_are_indexed_joined():
+    assert "cs101" in tokenize("CS 101 and cs101")
+
+
+def test_bm25_ranks_the_most_relevant_chunk_first():
+    index = BM25Index.build(DOCS)
+    assert [chunk_id for chunk_id, _ in index.search("fees")] == ["scholarship", "fees"]
+    assert index.search("CS101")[0][0] == "cs101"
+    assert index.search("housing for students", k=1)[0][0] == "housing"
+    assert index.search("parking") == []
+
+
+def test_incremental_update_scores_like_a_rebuild():
+    added = [("fees", "Graduate tuition fees are listed per program."), ("parking", "Parking permits for students.")]
+    updated = BM25Index.build(DOCS).updated({"fees", "housing"}, added)
+    rebuilt = BM25Index.build([d for d in DOCS if d[0] not in ("fees", "housing")] + added)
+    for query in ("tuition fees", "students", "parking permits", "cs101"):
+        assert dict(updated.search(query)) == dict(rebuilt.search(query))
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+async def collect(stream):
+    return [piece async for piece in stream]
+
+
+def test_concurrent_requests_share_one_answer():
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        for piece in ("Fees ", "are ", "listed."):
+            await asyncio.sleep(0.01)
+            yield piece
+
+    async def main():
+        flights = SingleFlight()
+        first = asyncio.create_task(collect(flights.stream("fees", produce)))
+        await asyncio.sleep(0.015)  # join mid-answer: the first piece is replayed
+        answers = await asyncio.gather(first, *(collect(flights.stream("fees", produce)) for _ in range(3)))
+        return answers, flights.stats()
+
+    answers, stats = asyncio.run(main())
+    assert answers == [["Fees ", "are ", "listed."]] * 4
+    assert len(calls) == 1
+    assert stats == {"in_flight": 0, "started": 1, "coalesced": 3}
+
+
+def test_errors_reach_every_subscriber():
+    async def produce():
+        yield "partial"
+        raise ValueError("upstream failed")
+
+    async def main():
+        flights = SingleFlight()
+        return await asyncio.gather(*(collect(flights.stream("q", produce)) for _ in range(2)), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
+
+
+def test_cancelled_work_releases_its_subscribers():
+    async def produce():
+        yield "partial"
+        await asyncio.sleep(10)
+        yield "never"
+
+    async def main():
+        flights = SingleFlight()
+        streams = [asyncio.create_task(collect(flights.stream("q", produce))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        flights.flights["q"].task.cancel()
+        results = await asyncio.wait_for(asyncio.gather(*streams, return_exceptions=True), timeout=1)
+        return results, flights.stats()
+
+    results, stats = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) and "cancelled" in str(result) for result in results)
+    assert stats["in_flight"] == 0
+
+
+def test_a_subscriber_going_away_does_not_cancel_the_others():
+    async def produce():
+        for piece in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield piece
+
+    async def main():
+        flights = SingleFlight()
+        leaver = asyncio.create_task(collect(flights.stream("q", produce)))
+        stayer = asyncio.create_task(collect(flights.stream("q", produce)))
+        await asyncio.sleep(0.015)
+        leaver.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaver
+        return await stayer
+
+    assert asyncio.run(main()) == ["a", "b", "c"]
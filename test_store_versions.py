@@ -0,0 +1,33 @@
+import os
+
+from store_versions import (
+    STORE_MANIFEST_FILE,
+    current_version,
+    new_version_dir,
+    prune_versions,
+    set_current_version,
+    version_sort_key,
+)
+
+
+def test_same_second_versions_sort_by_counter():
+    names = ["v20250723T101500Z-10", "v20250723T101501Z", "v20250723T101500Z", "v20250723T101500Z-2"]
+    assert sorted(names, key=version_sort_key) == [
+        "v20250723T101500Z", "v20250723T101500Z-2", "v20250723T101500Z-10", "v20250723T101501Z"]
+
+
+def test_prune_keeps_the_newest_versions_and_current(tmp_path):
+    root = str(tmp_path)
+    for name in ["v20250723T101500Z"] + [f"v20250723T101500Z-{n}" for n in range(2, 12)]:
+        os.makedirs(os.path.join(root, name))
+        open(os.path.join(root, name, STORE_MANIFEST_FILE), "w").close()
+    set_current_version(root, "v20250723T101500Z-3")
+    prune_versions(root, keep=2)
+    assert sorted(os.listdir(root), key=version_sort_key) == [
+        "CURRENT", "v20250723T101500Z-3", "v20250723T101500Z-10", "v20250723T101500Z-11"]
+    assert current_version(root) == "v20250723T101500Z-3"
+
+
+def test_new_version_dir_never_reuses_a_name(tmp_path):
+    names = {new_version_dir(str(tmp_path))[0] for _ in range(12)}
+    assert len(names) == 12